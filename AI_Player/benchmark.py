@@ -0,0 +1,218 @@
+#
+# Benchmarks of the engine and solver hot paths
+#
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.append('../')
+from board_engine import MineSweeperEngine
+from profiler import Profiler
+from simulate import PRESETS, make_player
+
+'''
+Time the engine functions and the AI players on every board preset with fixed seeds,
+and write the results as JSON so two commits can be compared
+
+Engine functions are timed on mid-game positions: a probability player plays
+a few moves on a seeded board, then every timed call runs on a fresh copy of that position.
+Players are timed over full headless games (per move latency and games per second)
+
+Example (from the AI_Player folder):
+  python benchmark.py --output before.json
+  python benchmark.py --output after.json --compare before.json
+'''
+
+FUNCTIONS = (
+    "generate_grid", "discover_tiles", "win_test", "search_tiles",
+    "strategy_1", "strategy_2", "local_prob_calc",
+)
+
+
+def summarize(name, preset, samples):
+    """
+    Statistics of a list of durations in seconds
+    """
+    return {
+        "name": name,
+        "preset": preset,
+        "calls": len(samples),
+        "mean_s": statistics.fmean(samples),
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    # the players print every move
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def time_calls(fn, setup, repeat):
+    """
+    Time fn(setup()) repeat times, the setup is not timed
+    """
+    samples = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def mid_game_position(preset, seed, moves):
+    """
+    A headless probability player after up to `moves` moves on the board of the given seed,
+    the last position before the game ended if it ended earlier
+    """
+    player = make_player("prob", preset, record_data=False)
+    player.reset(seed=seed)
+    player.click_register(0, 0)
+    position = copy.deepcopy(player)
+    last_version = -1
+    with quiet():
+        for _ in range(moves):
+            no_move = player.version == last_version
+            last_version = player.version
+            player.play(no_move=no_move)
+            if player.game_failed or player.game_won:
+                break
+            position = copy.deepcopy(player)
+    return position
+
+
+def bench_engine(preset, seeds, repeat, moves):
+    results = []
+    width, height, bomb_count = PRESETS[preset]
+    samples = {name: [] for name in FUNCTIONS}
+
+    for seed in seeds:
+        engine = MineSweeperEngine(width, height, bomb_count, seed=seed)
+        samples["generate_grid"] += time_calls(lambda e: e.generate_grid(0, 0), lambda: engine, repeat)
+
+        engine.generate_grid(0, 0)
+        mines = engine.mines
+
+        def fresh_board():
+            engine.reset()
+            engine.set_mines(mines)
+            return engine
+
+        samples["discover_tiles"] += time_calls(lambda e: e.discover_tiles(0, 0), fresh_board, repeat)
+
+        position = mid_game_position(preset, seed, moves)
+        clone = lambda: copy.deepcopy(position)
+        with quiet():
+            samples["win_test"] += time_calls(lambda p: p.win_test(), clone, repeat)
+            samples["search_tiles"] += time_calls(lambda p: p.search_tiles(), clone, repeat)
+            samples["strategy_1"] += time_calls(lambda p: p.strategy_1(), clone, repeat)
+            samples["strategy_2"] += time_calls(lambda p: p.strategy_2(), clone, repeat)
+            samples["local_prob_calc"] += time_calls(lambda p: p.local_prob_calc(), clone, repeat)
+
+    for name in FUNCTIONS:
+        results.append(summarize(name, preset, samples[name]))
+    return results
+
+
+def bench_player(name, preset, seeds):
+    """
+    Full games of a player, one per seed
+    Every move (play call) and every game is timed by a profiler attached to the player
+    """
+    try:
+        player = make_player(name, preset, record_data=False)
+    except (ImportError, OSError) as error:
+        return {"name": name, "preset": preset, "skipped": str(error)}
+
+    profiler = Profiler()
+    profiler.attach(player, phases=("play",))
+    won = 0
+    for seed in seeds:
+        player.reset(seed=seed)
+        random.seed(seed)
+        with quiet():
+            player.play_game()
+        won += player.game_won
+
+    move_samples = [move["seconds"] for game in profiler.games for move in game["moves"]]
+    game_samples = [game["seconds"] for game in profiler.games]
+
+    result = summarize(name, preset, move_samples)
+    result["games"] = len(seeds)
+    result["won"] = won
+    result["games_per_second"] = len(seeds) / sum(game_samples)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Print the speedup of every entry against a previous run
+    """
+    previous = {(r["name"], r["preset"]): r for r in baseline["results"] if "median_s" in r}
+    for result in results:
+        key = (result["name"], result["preset"])
+        if "median_s" in result and key in previous:
+            ratio = previous[key]["median_s"] / result["median_s"] if result["median_s"] else float("inf")
+            print("{:<16} {:<13} {:>12.6f}s -> {:>12.6f}s  x{:.2f}".format(
+                key[0], key[1], previous[key]["median_s"], result["median_s"], ratio
+            ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine and the AI players")
+    parser.add_argument("--presets", nargs="+", choices=sorted(PRESETS), default=list(PRESETS))
+    parser.add_argument("--players", nargs="+", choices=("logic", "prob", "neural"), default=["logic", "prob", "neural"])
+    parser.add_argument("--seeds", type=int, default=5, help="number of seeded boards per preset")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per board for the engine functions")
+    parser.add_argument("--moves", type=int, default=10, help="moves played before timing the engine functions")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    seeds = list(range(args.seeds))
+    results = []
+    for preset in args.presets:
+        results += bench_engine(preset, seeds, args.repeat, args.moves)
+        for name in args.players:
+            results.append(bench_player(name, preset, seeds))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "seeds": seeds,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
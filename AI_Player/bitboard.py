@@ -0,0 +1,150 @@
+#
+# Bitboard layers of the board, optional backend of the rules engine
+#
+
+'''
+Bitboard:
+  Every layer of the board (mines, opened, flags, question marks) is a Python int
+  with one bit per tile, the tile x, y is the bit y * stride + x
+
+  The stride is width + 1: the extra column on the right of each row always stays empty,
+  so a horizontal shift moves the bits of the border column into it instead of the next row,
+  and masking with `full` drops them.
+  The 8 neighbors of every tile at once are the 8 shifted copies of a layer:
+    +-1 (left/right), +-stride (up/down), +-(stride - 1) and +-(stride + 1) (diagonals)
+
+  Neighbor counts are added bit-sliced: 4 layers hold the bits 0..3 of the count
+  of every tile, and each shifted copy is added with a ripple of xor/and,
+  so a whole board query is a few dozen operations on big ints
+'''
+
+
+def mask_tiles(mask, stride):
+    """
+    Tiles of the bits set in mask (the tile x, y is the bit y * stride + x),
+    sorted by x then y like the tile scans of the players
+    """
+    # one pass over the binary digits, lowest bit first
+    digits = bin(mask)[:1:-1]
+    tiles = []
+    index = digits.find("1")
+    while index >= 0:
+        tiles.append((index % stride, index // stride))
+        index = digits.find("1", index + 1)
+    tiles.sort()
+    return tiles
+
+
+class BitBoard:
+    """
+    Mines, opened tiles, flags and question marks of a board as big int bitsets
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.stride = width + 1
+
+        row = (1 << width) - 1
+        self.full = 0
+        for y in range(height):
+            self.full |= row << (y * self.stride)
+        self.clear()
+
+    def clear(self):
+        self.mines = 0
+        self.numbers = 0
+        self.opened = 0
+        self.flags = 0
+        self.marks = 0
+
+    def bit(self, x, y):
+        return 1 << (y * self.stride + x)
+
+    def set_mines(self, mines):
+        """
+        Mines from a boolean array of shape (height, width), numbers are the safe tiles with a mine around
+        """
+        self.mines = 0
+        for y, mine_row in enumerate(mines.tolist()):
+            for x, mine in enumerate(mine_row):
+                if mine:
+                    self.mines |= self.bit(x, y)
+        planes = self.neighbor_counts(self.mines)
+        self.numbers = (planes[0] | planes[1] | planes[2] | planes[3]) & ~self.mines
+
+    def set_state(self, x, y, state):
+        """
+        Follow the clicked state of a tile: True (opened), False, "F" or "?"
+        """
+        bit = self.bit(x, y)
+        self.flags &= ~bit
+        self.marks &= ~bit
+        if state is True:
+            self.opened |= bit
+        elif state == "F":
+            self.flags |= bit
+        elif state == "?":
+            self.marks |= bit
+
+    def shifted(self, layer):
+        """
+        The 8 copies of the layer moved onto each neighbor of its tiles
+        """
+        stride = self.stride
+        return [
+            (layer << 1) & self.full, layer >> 1,
+            (layer << stride) & self.full, layer >> stride,
+            (layer << (stride - 1)) & self.full, layer >> (stride - 1),
+            (layer << (stride + 1)) & self.full, layer >> (stride + 1),
+        ]
+
+    def spread(self, layer):
+        """
+        Tiles with at least one neighbor in the layer
+        """
+        result = 0
+        for copy in self.shifted(layer):
+            result |= copy
+        return result & self.full
+
+    def neighbor_counts(self, layer):
+        """
+        Number of neighbors in the layer of every tile, as 4 bit planes (bit 0 first)
+        """
+        planes = [0, 0, 0, 0]
+        for carry in self.shifted(layer):
+            carry &= self.full
+            for i in range(4):
+                if not carry:
+                    break
+                planes[i], carry = planes[i] ^ carry, planes[i] & carry
+        return planes
+
+    def hidden(self):
+        # unopened tiles neither flagged nor marked (clicked state False)
+        return self.full & ~(self.opened | self.flags | self.marks)
+
+    def frontier_unknowns(self):
+        """
+        Unopened tiles next to an opened tile
+        """
+        return self.hidden() & self.spread(self.opened)
+
+    def frontier_numbers(self):
+        """
+        Opened number tiles with an unopened neighbor
+        """
+        return self.opened & self.numbers & self.spread(self.hidden())
+
+    def won(self):
+        """
+        Every safe tile opened or marked and exactly the mines flagged (same rule as the engine counters)
+        """
+        return self.hidden() & ~self.mines == 0 and self.flags == self.mines
+
+    def tiles(self, layer):
+        """
+        Tiles of the bits set in the layer, sorted by x then y (see mask_tiles)
+        """
+        return mask_tiles(layer, self.stride)
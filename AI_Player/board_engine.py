@@ -0,0 +1,511 @@
+#
+# Rules engine of the classic Minesweeper game, without any display
+#
+
+import datetime
+import struct
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+from bitboard import BitBoard
+
+# serialized board: width and height (2 unsigned shorts), then the bomb bitset
+BOARD_HEADER = struct.Struct("<HH")
+
+
+def encode_board(mines):
+    """
+    Serialize a boolean bomb array of shape (height, width) into bytes:
+    the dimensions followed by one bit per tile
+    """
+    height, width = mines.shape
+    return BOARD_HEADER.pack(width, height) + np.packbits(mines, axis=None).tobytes()
+
+
+def decode_board(data, offset=0):
+    """
+    Read a board serialized by encode_board starting at offset
+    Returns the boolean bomb array and the offset right after the board
+    """
+    width, height = BOARD_HEADER.unpack_from(data, offset)
+    offset += BOARD_HEADER.size
+    size = (width * height + 7) // 8
+    bits = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+    mines = np.unpackbits(bits, count=width * height).astype(bool).reshape(height, width)
+    return mines, offset + size
+
+
+def save_boards(path, boards):
+    """
+    Write a list of bomb arrays to a file, one serialized board after the other
+    """
+    with open(path, "wb") as f:
+        for mines in boards:
+            f.write(encode_board(mines))
+
+
+def load_boards(path):
+    """
+    Read every board of a file written by save_boards
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    boards = []
+    offset = 0
+    while offset < len(data):
+        mines, offset = decode_board(data, offset)
+        boards.append(mines)
+    return boards
+
+
+@lru_cache(maxsize=None)
+def neighbor_tables(width, height):
+    """
+    Neighbors of every tile of a board size, computed once per size
+    Tiles are keyed by their flat index y * width + x, neighbors go column by column
+    from the top left (x - 1 then x then x + 1, from y - 1 to y + 1 in each column)
+    Returns (neighbors, padded):
+      neighbors[i]: tuple of the (u, v) tiles around the tile inside the board
+      padded[i]: the 8 flat indices around the tile, -1 outside the board
+    """
+    neighbors = []
+    padded = []
+    for y in range(height):
+        for x in range(width):
+            tiles = []
+            indices = []
+            for u in range(x - 1, x + 2):
+                for v in range(y - 1, y + 2):
+                    if u == x and v == y:
+                        continue
+                    if 0 <= u < width and 0 <= v < height:
+                        tiles.append((u, v))
+                        indices.append(v * width + u)
+                    else:
+                        indices.append(-1)
+            neighbors.append(tuple(tiles))
+            padded.append(tuple(indices))
+    return tuple(neighbors), tuple(padded)
+
+
+class MineSweeperEngine:
+    """
+    Board and rules of the classic MineSweeper, independent of pygame
+
+    The engine only knows about the grid, the clicks and the game status,
+    so games can be simulated on machines without a display.
+    The pygame view (MineSweeper) is an optional layer built on top of it.
+
+    !!! NOTE:
+    Same conventions as the view, a tile is described as tile[y][x]
+    grid holds " " (empty), "*" (bomb) or the number of adjacent bombs
+    clicked_grid holds False (unopened), True (opened), "F" (flag) or "?"
+
+    With bitboard=True the same state is also kept as big int bitsets (see bitboard.py),
+    whole board queries (win test, tile scans, frontier masks) then use shifts and masks
+    and the frontier sets are not maintained
+    """
+
+    def __init__(self, width=80, height=45, bomb_count=742, seed=None, bitboard=False):
+        self.width = width
+        self.height = height
+        self.bomb_count = bomb_count
+        self.bitboard = BitBoard(width, height) if bitboard else None
+        # shared by every engine of the same size, see neighbor_tables
+        self.neighbors, self.padded_neighbors = neighbor_tables(width, height)
+        # every random choice of the engine comes from this generator,
+        # the same seed gives the same boards
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self, seed=None):
+        """
+        Start a new game on the same board size
+        If a seed is given, the random generator is seeded again
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        self.grid = None
+        self.mines = None
+        self.clicked_grid = [
+            [False for x in range(self.width)] for y in range(self.height)
+        ]
+        self.first_click = True
+        self.game_failed = False
+        self.game_won = False
+        self.bomb_left = self.bomb_count
+        # bookkeeping for the win test, maintained on every click
+        # hidden_safe: unopened tiles without bomb
+        # correct_flags/wrong_flags: flags on a bomb/on a safe tile
+        self.hidden_safe = None
+        self.correct_flags = 0
+        self.wrong_flags = 0
+        # frontier, maintained as tiles are opened or flagged (left empty with the bitboard)
+        # frontier_numbers: opened number tiles with unopened neighbors
+        # frontier_unknowns: unopened tiles next to an opened tile
+        self.frontier_numbers = set()
+        self.frontier_unknowns = set()
+        # increased by the number of tiles changed on every click,
+        # an unchanged version means nothing happened in between
+        self.version = 0
+        self.timer = 0
+        self.start_time = None
+        if self.bitboard is not None:
+            self.bitboard.clear()
+
+    def tiles_changed(self, tiles):
+        """
+        View hook called with the list of tiles whose state changed,
+        nothing to draw without a display
+        """
+
+    def show_bombs(self, exploded_x, exploded_y):
+        """
+        View hook called when a bomb exploded,
+        nothing to draw without a display
+        """
+
+    def click_register(self, x, y):
+        """
+        When a user left click on the tile at position x, y
+        Returns the list of tiles opened by this click
+        """
+        revealed = self.open_tile(x, y)
+        if revealed:
+            self.register_changes(revealed)
+            if self.game_failed:
+                self.show_bombs(x, y)
+        return revealed
+
+    def right_click_register(self, x, y):
+        """
+        When a user right click on the tile at position x, y
+        """
+        if self.clicked_grid[y][x] is True:
+            return
+
+        self.toggle_flag(x, y)
+        self.register_changes([(x, y)])
+
+    def apply_moves(self, moves):
+        """
+        Apply a batch of moves, each one ("open", x, y), ("flag", x, y) or ("chord", x, y):
+          open: left click, flag: flag the tile if it is unopened (never removes a flag),
+          chord: open the unflagged neighbors of an opened number with as many flags around it
+        The moves after a bomb exploded are ignored, and so is the whole batch on a finished game,
+        the view is notified once for the whole batch
+        Every move is checked before any is applied: an unknown action or a tile out of the board
+        raises a ValueError and leaves the board unchanged
+        Returns the change delta:
+          {"revealed": [(x, y, value in grid)], "flagged": [(x, y)], "status": "playing", "won" or "failed"}
+        """
+        moves = list(moves)
+        for action, x, y in moves:
+            if action not in ("open", "flag", "chord"):
+                raise ValueError("Unknown move: {}".format(action))
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                raise ValueError("Tile out of the board: {}, {}".format(x, y))
+
+        revealed = []
+        flagged = []
+        exploded = None
+        try:
+            for action, x, y in moves:
+                if self.game_failed or self.game_won:
+                    break
+                if action == "flag":
+                    if self.clicked_grid[y][x] is False:
+                        self.toggle_flag(x, y)
+                        flagged.append((x, y))
+                    continue
+                opened = self.open_tile(x, y) if action == "open" else self.chord_tile(x, y)
+                revealed += opened
+                if self.game_failed:
+                    # the bomb is the last tile opened by this move
+                    exploded = opened[-1]
+        finally:
+            # whatever was applied is recorded, even if a move failed half way
+            if revealed or flagged:
+                self.register_changes(revealed + flagged)
+            if exploded is not None:
+                self.show_bombs(*exploded)
+        self.win_test()
+
+        status = "failed" if self.game_failed else ("won" if self.game_won else "playing")
+        return {
+            "revealed": [(x, y, self.grid[y][x]) for x, y in revealed],
+            "flagged": flagged,
+            "status": status,
+        }
+
+    def open_tile(self, x, y):
+        """
+        Open the tile at position x, y, and the empty region around it,
+        without notifying the view (see click_register)
+        Returns the list of newly opened tiles
+        """
+        # Bombs are placed after the first click, away from the clicked
+        # tile and its neighbors, so the first click always opens an empty tile
+        if self.first_click:
+            self.first_click = False
+            if self.grid is None:
+                self.generate_grid(x, y)
+            self.start_time = datetime.datetime.now()
+
+        revealed = []
+        if self.clicked_grid[y][x] is False:
+
+            self.clicked_grid[y][x] = True
+            revealed.append((x, y))
+            if self.grid[y][x] == "*":
+                self.game_failed = True
+            else:
+                self.hidden_safe -= 1
+                if self.grid[y][x] == " ":
+                    revealed += self.discover_tiles(x, y)
+        return revealed
+
+    def chord_tile(self, x, y):
+        """
+        Open the unflagged neighbors of the opened number tile at position x, y
+        when the number of flags around it matches its number
+        Returns the list of newly opened tiles
+        """
+        if self.clicked_grid[y][x] is not True or not isinstance(self.grid[y][x], int):
+            return []
+
+        neighbors = self.neighbors[y * self.width + x]
+        if sum(1 for u, v in neighbors if self.clicked_grid[v][u] == "F") != self.grid[y][x]:
+            return []
+
+        revealed = []
+        for u, v in neighbors:
+            if self.game_failed:
+                break
+            revealed += self.open_tile(u, v)
+        return revealed
+
+    def toggle_flag(self, x, y):
+        """
+        Cycle the unopened tile at position x, y through flag, question mark and unopened,
+        keeping the counters up to date, without notifying the view
+        """
+        # before the first click there is no grid yet,
+        # the counters are computed when the grid is generated
+        has_bomb = self.grid is not None and self.grid[y][x] == "*"
+        counted = self.grid is not None
+
+        if self.clicked_grid[y][x] == "F":
+            self.clicked_grid[y][x] = "?"
+            self.bomb_left += 1
+            if has_bomb:
+                self.correct_flags -= 1
+            elif counted:
+                self.wrong_flags -= 1
+        elif self.clicked_grid[y][x] == "?":
+            self.clicked_grid[y][x] = False
+            if counted and not has_bomb:
+                self.hidden_safe += 1
+        elif self.clicked_grid[y][x] is False:
+            self.clicked_grid[y][x] = "F"
+            self.bomb_left -= 1
+            if has_bomb:
+                self.correct_flags += 1
+            elif counted:
+                self.wrong_flags += 1
+                self.hidden_safe -= 1
+
+    def register_changes(self, tiles):
+        """
+        Bookkeeping after the given tiles changed state:
+        version, bitboard or frontier sets, then the view hook
+        """
+        self.version += len(tiles)
+        if self.bitboard is not None:
+            # the frontier comes from the masks (see BitBoard.frontier_numbers)
+            for x, y in tiles:
+                self.bitboard.set_state(x, y, self.clicked_grid[y][x])
+        else:
+            self.update_frontier(tiles)
+        self.tiles_changed(tiles)
+
+    def discover_tiles(self, x, y):
+        """
+        Open the empty region around the empty tile at position x, y
+        with a worklist instead of recursion, every tile is opened once:
+        unopened neighbors are opened, and empty ones are queued in turn
+        Returns the list of newly opened tiles
+        """
+        revealed = []
+        queue = deque([(x, y)])
+        while queue:
+            x, y = queue.popleft()
+            for u, v in self.neighbors[y * self.width + x]:
+                if self.clicked_grid[v][u] is False:
+                    self.clicked_grid[v][u] = True
+                    self.hidden_safe -= 1
+                    revealed.append((u, v))
+                    if self.grid[v][u] == " ":
+                        queue.append((u, v))
+        return revealed
+
+    def update_frontier(self, tiles):
+        """
+        Update the frontier sets after the given tiles changed,
+        only these tiles and their neighbors can enter or leave the frontier
+        """
+        candidates = set(tiles)
+        for x, y in tiles:
+            candidates.update(self.neighbors[y * self.width + x])
+
+        for x, y in candidates:
+            state = self.clicked_grid[y][x]
+            if state is False:
+                # unopened tile, on the frontier if any neighbor is opened
+                if self.has_neighbor(x, y, True):
+                    self.frontier_unknowns.add((x, y))
+                else:
+                    self.frontier_unknowns.discard((x, y))
+                continue
+
+            self.frontier_unknowns.discard((x, y))
+            # number tile, on the frontier while a neighbor is unopened
+            if (
+                state is True
+                and isinstance(self.grid[y][x], int)
+                and self.has_neighbor(x, y, False)
+            ):
+                self.frontier_numbers.add((x, y))
+            else:
+                self.frontier_numbers.discard((x, y))
+
+    def has_neighbor(self, x, y, state):
+        """
+        Test if any of the 8 adjacent tiles is in the given clicked state
+        """
+        for u, v in self.neighbors[y * self.width + x]:
+            if self.clicked_grid[v][u] is state:
+                return True
+        return False
+
+    def win_test(self):
+        """
+        Test if player has won the game or not
+        and update self.game_won
+        The game is won when every bomb is flagged, no safe tile is flagged
+        and no safe tile is left unopened, read from the counters
+        or from the bitboard when enabled
+        """
+        if self.bitboard is not None:
+            if self.grid is not None and self.bitboard.won():
+                self.game_won = True
+        elif (
+            self.grid is not None
+            and self.hidden_safe == 0
+            and self.wrong_flags == 0
+            and self.correct_flags == self.bomb_count
+        ):
+            self.game_won = True
+
+    def count_tiles(self):
+        """
+        Compute the win test counters from scratch,
+        used once when the grid is generated
+        """
+        self.hidden_safe = 0
+        self.correct_flags = 0
+        self.wrong_flags = 0
+        for y in range(self.height):
+            for x in range(self.width):
+                has_bomb = self.grid[y][x] == "*"
+                if self.clicked_grid[y][x] == "F":
+                    if has_bomb:
+                        self.correct_flags += 1
+                    else:
+                        self.wrong_flags += 1
+                elif self.clicked_grid[y][x] is False and not has_bomb:
+                    self.hidden_safe += 1
+
+    def generate_grid(self, safe_x=None, safe_y=None):
+        """
+        Generate a random grid filled with bomb and with numbers
+        If a safe tile is given, neither it nor its 8 adjacent tiles get a bomb
+        """
+        self.set_mines(self.place_bombs(safe_x, safe_y))
+
+    def set_mines(self, mines):
+        """
+        Build the grid from a boolean bomb array of shape (height, width)
+        """
+        self.mines = mines
+        counts = self.attribute_value(self.mines)
+
+        self.grid = [
+            [
+                "*" if mine else (count if count > 0 else " ")
+                for mine, count in zip(mine_row, count_row)
+            ]
+            for mine_row, count_row in zip(self.mines.tolist(), counts.tolist())
+        ]
+        if self.bitboard is not None:
+            self.bitboard.set_mines(mines)
+        self.count_tiles()
+
+    def board_bytes(self):
+        """
+        Serialize the bombs of the current game, see encode_board
+        """
+        return encode_board(self.mines)
+
+    def load_board(self, data):
+        """
+        Play the next game on a board serialized by encode_board
+        instead of a random one, must be called before the first click
+        """
+        mines, _ = decode_board(data)
+        if mines.shape != (self.height, self.width) or int(mines.sum()) != self.bomb_count:
+            raise ValueError(
+                "Board of {}x{} with {} bombs does not match the game ({}x{}, {} bombs)".format(
+                    mines.shape[1], mines.shape[0], int(mines.sum()),
+                    self.width, self.height, self.bomb_count,
+                )
+            )
+        self.set_mines(mines)
+
+    def place_bombs(self, safe_x=None, safe_y=None):
+        """
+        Randomly place bombs on the grid, sampled directly among the tiles
+        outside the safe neighborhood
+        Returns a boolean array of shape (height, width)
+        """
+        allowed = np.ones((self.height, self.width), dtype=bool)
+        if safe_x is not None and safe_y is not None:
+            allowed[max(safe_y - 1, 0):safe_y + 2, max(safe_x - 1, 0):safe_x + 2] = False
+
+        candidates = np.flatnonzero(allowed)
+        if self.bomb_count > len(candidates):
+            raise ValueError(
+                "Cannot place {} bombs outside the first click neighborhood on a {}x{} grid".format(
+                    self.bomb_count, self.width, self.height
+                )
+            )
+
+        mines = np.zeros(self.width * self.height, dtype=bool)
+        mines[self.rng.choice(candidates, size=self.bomb_count, replace=False)] = True
+        return mines.reshape(self.height, self.width)
+
+    def attribute_value(self, mines):
+        """
+        Count the number of bomb in the 8 adjacent tiles of every tile,
+        by summing the 8 shifted copies of the zero padded bomb array
+        """
+        padded = np.pad(mines.astype(np.int8), 1)
+        counts = np.zeros((self.height, self.width), dtype=np.int8)
+        for n in range(3):
+            for m in range(3):
+                if n != 1 or m != 1:
+                    counts += padded[n:n + self.height, m:m + self.width]
+        return counts
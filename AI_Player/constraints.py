@@ -0,0 +1,132 @@
+#
+# Deterministic deductions from the frontier constraints
+#
+
+from math import gcd
+
+from prob_engine import split_components
+
+'''
+Constraint Solver:
+  Every number tile on the frontier gives a linear equation over its unopened neighbors:
+    sum of the mines on its unopened neighbors = number - flags around it
+  where every unknown is 0 (safe) or 1 (mine)
+
+  1. Split the frontier into independent components (see prob_engine.split_components)
+
+  2. Reduce the equations of a component with Gaussian elimination,
+  kept in integers (a row is combined as a * row - b * pivot, then divided by the gcd of its terms)
+
+  3. Bound check of every equation, the original ones and the reduced ones:
+    with S = sum of the positive coefficients and N = sum of the negative coefficients,
+    value == S: the unknowns with a positive coefficient are mines, the negative ones are safe
+    value == N: the unknowns with a positive coefficient are safe, the negative ones are mines
+
+  4. Substitute the new known tiles in the equations and start again,
+  until a pass finds nothing new
+
+  The pairs of strategy 2 are a special case of step 3 on the difference of two equations
+'''
+
+
+def eliminate(rows, n):
+    """
+    Integer Gaussian elimination of the rows (n coefficients, then the value)
+    Returns the non zero rows of the reduced matrix, every pivot is alone in its column
+    """
+    rows = [row[:] for row in rows]
+    pivot_row = 0
+    for col in range(n):
+        found = next((r for r in range(pivot_row, len(rows)) if rows[r][col]), None)
+        if found is None:
+            continue
+        rows[pivot_row], rows[found] = rows[found], rows[pivot_row]
+        pivot = rows[pivot_row]
+        for r in range(len(rows)):
+            if r == pivot_row or rows[r][col] == 0:
+                continue
+            a, b = pivot[col], rows[r][col]
+            row = [a * x - b * y for x, y in zip(rows[r], pivot)]
+            divisor = gcd(*row)
+            if divisor > 1:
+                row = [x // divisor for x in row]
+            rows[r] = row
+        pivot_row += 1
+    return [row for row in rows if any(row)]
+
+
+def bound_check(row, n):
+    """
+    Unknowns of a row fixed by its bounds
+    Returns a dict: column -> 0 (safe) or 1 (mine), None if the row can not be met
+    """
+    value = row[n]
+    positive = sum(c for c in row[:n] if c > 0)
+    negative = sum(c for c in row[:n] if c < 0)
+    if value > positive or value < negative:
+        return None
+    if value == positive:
+        return {col: 1 if c > 0 else 0 for col, c in enumerate(row[:n]) if c}
+    if value == negative:
+        return {col: 0 if c > 0 else 1 for col, c in enumerate(row[:n]) if c}
+    return {}
+
+
+def solve_component(tiles, constraints):
+    """
+    Returns the sets of (safe tiles, mine tiles) of one component
+    Nothing is deduced if its constraints contradict each other (wrong flags)
+    """
+    n = len(tiles)
+    index = {tile: i for i, tile in enumerate(tiles)}
+    rows = []
+    for constraint_tiles, mines in constraints:
+        row = [0] * (n + 1)
+        for tile in constraint_tiles:
+            row[index[tile]] = 1
+        row[n] = mines
+        rows.append(row)
+
+    known = {}
+    while rows:
+        found = {}
+        for row in rows + eliminate(rows, n):
+            fixed = bound_check(row, n)
+            if fixed is None:
+                return set(), set()
+            found.update(fixed)
+        found = {col: value for col, value in found.items() if col not in known}
+        if not found:
+            break
+        known.update(found)
+
+        # substitute the known tiles, the rows left without unknowns are dropped
+        substituted = []
+        for row in rows:
+            row = row[:]
+            for col, value in found.items():
+                row[n] -= row[col] * value
+                row[col] = 0
+            if any(row[:n]):
+                substituted.append(row)
+            elif row[n] != 0:
+                return set(), set()
+        rows = substituted
+
+    safe = {tiles[col] for col, value in known.items() if value == 0}
+    mines = {tiles[col] for col, value in known.items() if value == 1}
+    return safe, mines
+
+
+def solve_constraints(constraints):
+    """
+    Every tile that is provably safe or provably a mine under the constraints
+    constraints: list of (unopened tiles, number of mines among them)
+    Returns the sets (safe tiles, mine tiles)
+    """
+    safe, mines = set(), set()
+    for tiles, component_constraints in split_components(constraints):
+        component_safe, component_mines = solve_component(tiles, component_constraints)
+        safe |= component_safe
+        mines |= component_mines
+    return safe, mines
@@ -0,0 +1,133 @@
+#
+# Buffered writer of the ANN training data
+#
+
+import argparse
+import glob
+import os
+import struct
+import time
+from multiprocessing import util
+
+import numpy as np
+
+'''
+Data Sink:
+  The guesses of the players (neighborhood, probability, label) are buffered in memory
+  and written in bulk to .npy shard files, so a move does not open and close a file.
+
+  Every process writes its own shards (the process id is part of the file name),
+  so parallel simulations never write to the same file.
+  A new shard is started when the current one reaches max_shard_bytes.
+
+  The header of a shard is rewritten with the new number of rows on every flush,
+  so a shard is always a valid .npy file that np.load can read.
+
+  merge_shards combines the shards of a configuration into a single .npy file for training:
+    python data_sink.py --prefix data_80_45 ../data/shards ../data/data_80_45.npy
+'''
+
+# fixed size of the .npy header, so it can be rewritten in place as the shard grows
+HEADER_SIZE = 128
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def npy_header(rows, columns):
+    """
+    Header of a version 1.0 .npy file of float64 with the given shape, padded to HEADER_SIZE
+    """
+    header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (rows, columns)
+    header = header.ljust(HEADER_SIZE - len(NPY_MAGIC) - 2 - 1) + "\n"
+    return NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+class DataSink:
+    """
+    Buffer rows in memory and flush them to rotating .npy shards of this process
+    """
+
+    def __init__(self, directory, prefix="data", columns=11, buffer_rows=1024, max_shard_bytes=8 * 1024 * 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.columns = columns
+        self.buffer_rows = buffer_rows
+        self.max_shard_rows = max(1, max_shard_bytes // (columns * 8))
+
+        self.buffer = []
+        self.shard_path = None
+        self.shard_rows = 0
+        self.shard_index = 0
+        self.run_id = "{}-{}".format(time.strftime("%Y%m%d%H%M%S"), os.getpid())
+
+        # flush what is left when the process exits, pool workers included
+        util.Finalize(self, self.close, exitpriority=10)
+
+    def write(self, rows):
+        """
+        Add rows to the buffer, flushed to disk once buffer_rows are waiting
+        """
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered rows to the current shard, starting new shards when full
+        """
+        rows = np.asarray(self.buffer, dtype="<f8").reshape(-1, self.columns)
+        self.buffer = []
+        while len(rows) > 0:
+            if self.shard_path is None or self.shard_rows >= self.max_shard_rows:
+                self.open_shard()
+            chunk = rows[:self.max_shard_rows - self.shard_rows]
+            rows = rows[len(chunk):]
+
+            with open(self.shard_path, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                f.write(chunk.tobytes())
+                self.shard_rows += len(chunk)
+                f.seek(0)
+                f.write(npy_header(self.shard_rows, self.columns))
+
+    def open_shard(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.shard_path = os.path.join(
+            self.directory, "{}-{}-{:04d}.npy".format(self.prefix, self.run_id, self.shard_index)
+        )
+        self.shard_index += 1
+        self.shard_rows = 0
+        with open(self.shard_path, "wb") as f:
+            f.write(npy_header(0, self.columns))
+
+    def close(self):
+        if self.buffer:
+            self.flush()
+
+
+def shard_paths(directory, prefix="data"):
+    return sorted(glob.glob(os.path.join(directory, "{}-*.npy".format(prefix))))
+
+
+def merge_shards(directory, output, prefix="data"):
+    """
+    Concatenate every shard of the directory into a single .npy file
+    Returns the number of rows written
+    """
+    shards = [np.load(path, mmap_mode="r") for path in shard_paths(directory, prefix)]
+    shards = [shard for shard in shards if len(shard) > 0]
+    if not shards:
+        return 0
+    merged = np.concatenate(shards)
+    np.save(output, merged)
+    return len(merged)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the data shards into a single .npy file")
+    parser.add_argument("directory", nargs="?", default="../data/shards/")
+    parser.add_argument("output", nargs="?", default="../data/data_80_45.npy")
+    parser.add_argument("--prefix", default="data_80_45", help="shards of this configuration only")
+    args = parser.parse_args()
+
+    rows = merge_shards(args.directory, args.output, args.prefix)
+    print("Merged {} rows into {}".format(rows, args.output))
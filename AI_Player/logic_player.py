@@ -1,17 +1,24 @@
 import random
 import sys
 import pygame
+import time
 from time import sleep
 import matplotlib.pyplot as plt
-import copy
 
 sys.path.append('../')
 from mine_sweeper import MineSweeper
+from bitboard import mask_tiles
+from constraints import solve_constraints
+from pattern_cache import OUT, UNKNOWN, shared_cache, tile_code, window_tables
+from profiler import Profiler, append_jsonl, game_summary, run_summary
 
 GAME_PLAYED = 0
 GAME_WON = 0
 WIN_RATE = [0]
 
+# seconds between two checks of the window events when the turbo mode draws no frame
+EVENT_INTERVAL = 0.25
+
 '''
 Rule: 
   Flaw of this game design: I haven't fixed this bug yet so will just follow the rule below for now:
@@ -41,60 +48,202 @@ Set-Logic Player Class:
   then open all the unopened tiles around it
 
   3. Strategy 2: 
-    For a pair of open tile adjacent to each other:
-    let nfn_a = set of unopened tiles 
-    let nfn_b = set of unopened tiles
+    For every pair of frontier number tiles a and b sharing an unopened tile
+    (orthogonal, diagonal or two tiles apart), with their unopened tiles as bitmasks:
+    let nfn_a = bitmask of the unopened tiles around a
+    let nfn_b = bitmask of the unopened tiles around b
 
     let a_val = value of tile a - number of flags around tile a
     let b_val = value of tile b - number of flags around tile b
 
-    if a_val > b_val:
-      if a_val - b_val = nfn_a - nfn_b:
-        flag all tiles in nfn_a - nfn_b
-        open all tiles in nfn_b - nfn_a
-    else:
-      if b_val - a_val = nfn_b - nfn_a:
-        flag all tiles in nfn_b - nfn_a
-        open all tiles in nfn_a - nfn_b
+    if a_val - b_val = number of tiles in nfn_a & ~nfn_b:
+      flag all tiles in nfn_a & ~nfn_b
+      open all tiles in nfn_b & ~nfn_a
+    else if b_val - a_val = number of tiles in nfn_b & ~nfn_a:
+      flag all tiles in nfn_b & ~nfn_a
+      open all tiles in nfn_a & ~nfn_b
+
+    Every pair is checked in both directions, the moves of all the pairs are made together
+    (a tile found both safe and a mine comes from a wrong flag and is left)
+    With the pattern cache, the same rules are read from the 5x5 window of each number (see pattern_cache.py)
 
-  4. If no move can be made, randomly open a tile
+  4. Strategy 3, only when strategies 1 and 2 made no move:
+    Solve the constraints of the whole frontier at once (see constraints.py),
+    flag every tile that is provably a mine and open every tile that is provably safe
+
+  5. If no move can be made, randomly open a tile
   '''
 class logicPlayer(MineSweeper):
 
-  def play_simply(self):
-    old_state = None
-    new_state = copy.deepcopy(self.clicked_grid)
-    
-    pygame.init()
-    self.init_display()
+  def __init__(self, pattern_cache=False, **kwargs):
+    '''
+    pattern_cache: strategy 2 reads the deductions of the 5x5 window of each number tile
+    from the cache of this process (see pattern_cache.py) instead of comparing the pairs of constraints,
+    and both strategies only read again the numbers with a change around them
+    '''
+    # set first, the engine resets the board while it sets up
+    self.pattern_cache = shared_cache() if pattern_cache else None
+    super().__init__(**kwargs)
+    if self.pattern_cache is not None:
+      self.window_getters = window_tables(self.width, self.height)
+      self.center_getters = window_tables(self.width, self.height, 3)
+
+  def reset(self, seed=None):
+    super().reset(seed)
+    if self.pattern_cache is None:
+      return
+    # pattern code of every tile (see pattern_cache.py), then OUT for the tiles out of the board
+    self.tile_codes = [UNKNOWN] * (self.width * self.height) + [OUT]
+    # with the pattern cache, the strategies only read the numbers changed since their last sweep:
+    # the clock counts the sweeps, every tile (then the tiles out of the board) keeps the clock
+    # of its last change and every strategy the clock of its last sweep
+    self.pattern_clock = 0
+    self.tile_clocks = [0] * (self.width * self.height + 1)
+    self.swept = {}
+
+  def tiles_changed(self, tiles):
+    super().tiles_changed(tiles)
+    if self.pattern_cache is None:
+      return
+    for x, y in tiles:
+      index = y * self.width + x
+      self.tile_codes[index] = tile_code(self.clicked_grid[y][x], self.grid[y][x])
+      self.tile_clocks[index] = self.pattern_clock
+
+  def play_simply(self, turbo=False, render_every=None, render_interval=None, profile=None):
+    '''
+    Play games in the window one after the other
+    turbo=False: one move per frame at 60 frames per second
+    turbo=True: no frame clock, the moves are made as fast as the solver goes,
+    the window is drawn every render_every moves and/or every render_interval seconds,
+    and only at the end of each game when both are None
+    profile: JSON lines file of the timing of every phase (see profiler.py),
+    a line is written as each game ends and the line of the run when the window is closed
+    '''
+    if render_every is not None and render_every < 1:
+      raise ValueError("render_every must be a positive number of moves, got {}".format(render_every))
 
-    # Make the first move at the top left corner
-    self.click_register(0,0)
+    if profile is not None:
+      Profiler().attach(self)
+      self.profile_path = profile
+      open(profile, "w").close()
+
+    pygame.init()
+    self.start_game()
+    self.start_profile()
+    # in turbo mode nothing is drawn between the frames
+    self.drawing = not turbo
+    # engine version seen before the last move,
+    # if it did not change the last move did nothing
+    last_version = -1
+    moves = 0
+    last_frame = time.perf_counter()
 
     while True:
-      pygame.display.update()
-      self.clock.tick(60)
-  
-      if self.game_failed is False and self.game_won is False:
-        old_state = copy.deepcopy(new_state)
-        new_state = copy.deepcopy(self.clicked_grid)
-        self.play() if new_state != old_state else self.play(no_move=True)
-        if(new_state == old_state):
+      now = time.perf_counter()
+      game_over = self.game_failed is not False or self.game_won is not False
+      if not turbo:
+        self.handle_events()
+        self.update_display()
+        self.clock.tick(60)
+      elif (
+        game_over
+        or (render_every is not None and moves % render_every == 0)
+        or (render_interval is not None and now - last_frame >= render_interval)
+      ):
+        self.render_frame(turbo)
+        last_frame = now
+      elif now - last_frame >= EVENT_INTERVAL:
+        # keep the window responsive even without frames
+        self.handle_events()
+        last_frame = now
+
+      if not game_over:
+        no_move = self.version == last_version
+        last_version = self.version
+        guessed = self.play(no_move=no_move)
+        moves += 1
+        if guessed:
           print("no change, apply random")
           #self.play(no_move=True)
           
       else:
+        self.end_profile()
         self.plot_win_rate()
 
-        # Reset the game
+        # Reset the game, the loop goes on with the next one
         self.face_click()
-        self.game_failed = False
+        last_version = -1
 
       self.update_timer()
 
-  def play(self, no_move=False):
-    
+  def render_frame(self, turbo=False):
+    '''
+    Draw what changed since the last frame and push it to the screen,
+    in turbo mode drawing is paused again until the next frame
+    '''
+    self.handle_events()
+    self.drawing = True
+    self.display_tiles()
+    self.display_top_bar()
+    self.update_timer()
+    self.update_display()
+    self.drawing = not turbo
+
+  def handle_events(self):
+    for event in pygame.event.get():
+      if event.type == pygame.QUIT:
+        if getattr(self, "profile_path", None) is not None:
+          append_jsonl(self.profile_path, run_summary(self.profiler.games))
+        quit()
+
+  def start_profile(self):
+    # a game of the window starts, timed when play_simply profiles
+    if getattr(self, "profile_path", None) is not None:
+      self.profiler.start_game()
+
+  def end_profile(self):
+    '''
+    Write the timing of the game that just ended, when play_simply profiles
+    '''
+    if getattr(self, "profile_path", None) is not None and self.profiler.current is not None:
+      record = self.profiler.end_game()
+      append_jsonl(self.profile_path, game_summary(record, len(self.profiler.games) - 1))
+
+  def start_game(self):
+    # Make the first move at the top left corner
+    self.init_display()
+    self.click_register(0,0)
+
+  def play_game(self):
+    '''
+    Play one game until it is won or lost, without frame clock
+    (use a headless player to skip the display entirely)
+    Returns the number of moves and the number of guesses made
+    '''
+    moves = 0
+    guesses = 0
+    last_version = self.version
 
+    # Make the first move at the top left corner
+    self.click_register(0,0)
+
+    while self.game_failed is False and self.game_won is False:
+      no_move = self.version == last_version
+      last_version = self.version
+      guessed = self.play(no_move=no_move)
+      moves += 1
+      if guessed:
+        guesses += 1
+
+    return moves, guesses
+
+  def play(self, no_move=False):
+    '''
+    One move: the strategies, then a random guess if the last move changed nothing
+    and strategy 3 finds nothing either
+    Returns True if a guess was made
+    '''
     self.strategy_1()
     self.strategy_2()
 
@@ -106,6 +255,9 @@ class logicPlayer(MineSweeper):
       #sleep(1)
       self.display_tiles()
 
+    if no_move is True:
+      no_move = self.strategy_3()
+
     if no_move is True:
       # Pick one in the unopened tiles
       tile = self.search_tiles(open=False, early_stop=True)
@@ -117,11 +269,18 @@ class logicPlayer(MineSweeper):
         
     self.display_top_bar()
     self.win_test()
+    # still True only if the guess above was made
+    return no_move
 
   def strategy_1(self):
     # same as algorithm 1
+    # only the number tiles on the frontier (see MineSweeperEngine) can lead to a move
     no_move = True
-    open_tiles = self.search_tiles(open=True)
+    if self.pattern_cache is not None:
+      # nothing changed around the other numbers since the last pass, same result
+      open_tiles = self.changed_numbers("strategy_1")
+    else:
+      open_tiles = self.frontier_number_tiles()
 
     for tile in open_tiles:
       x, y = tile
@@ -137,42 +296,117 @@ class logicPlayer(MineSweeper):
 
     return no_move
   
-  def strategy_2(self):
-    no_move = True
-    open_tiles = self.search_tiles(open=True)
-
-    numbered_tiles = self.numbered_tiles(open_tiles)
-    open_pairs = []
-    for i in range(len(numbered_tiles)):
-      first_tile = numbered_tiles[i]
-
-      for direction in [(0,1), (0,-1), (1,0), (-1,0)]:
-        second_tile = (first_tile[0] + direction[0], first_tile[1] + direction[1])
-        if self.is_valid_tile(second_tile[0], second_tile[1]) and second_tile in numbered_tiles:
-          open_pairs.append((first_tile, second_tile))
-    
- 
-    # For each pair of open adjacent tiles, check if the number of unopened tiles around them
-    # is equal to the difference between the value of the tiles and the number of flags around them
-    for pair in open_pairs:
-      tile_a = pair[0]
-      tile_b = pair[1]
-
-      unopened_a, flag_a = self.neighbors_and_flags(tile_a[0], tile_a[1])
-      unopened_b, flag_b = self.neighbors_and_flags(tile_b[0], tile_b[1])
+  def changed_numbers(self, sweep):
+    '''
+    Frontier numbers with a tile changed around them since the last sweep of the same name
+    '''
+    since = self.swept.get(sweep, 0)
+    self.pattern_clock += 1
+    self.swept[sweep] = self.pattern_clock
+    return [
+      (x, y) for x, y in self.frontier_number_tiles()
+      if max(self.center_getters[y * self.width + x](self.tile_clocks)) >= since
+    ]
+
+  def strategy_patterns(self):
+    '''
+    Strategy 2 from the pattern cache: the deductions of the 5x5 window around every frontier number,
+    which solves the numbers of its 3x3 center together
+    Only the windows with a tile changed around their center since the last pass are read again:
+    a change next to a number is in the windows of this number and of its neighbors,
+    so every single number and every pair of adjacent numbers is solved again
+    '''
+    safe_tiles = set()
+    mine_tiles = set()
+    for x, y in self.changed_numbers("strategy_patterns"):
+      safe, mines = self.pattern_cache.lookup(self.window_codes(x, y))
+      if safe:
+        safe_tiles.update((x + i % 5 - 2, y + i // 5 - 2) for i in safe)
+      if mines:
+        mine_tiles.update((x + i % 5 - 2, y + i // 5 - 2) for i in mines)
+
+    # a tile found both ways comes from inconsistent flags, leave it
+    conflict = safe_tiles & mine_tiles
+    self.flag_tiles(sorted(mine_tiles - conflict))
+    self.open_tiles(sorted(safe_tiles - conflict))
+    return not (safe_tiles - conflict or mine_tiles - conflict)
+
+  def window_codes(self, x, y):
+    '''
+    Encoding of the 5x5 window centered on the tile at x, y, row by row (see pattern_cache.py)
+    '''
+    return self.window_getters[y * self.width + x](self.tile_codes)
 
-      nfn_a = set(unopened_a)
-      nfn_b = set(unopened_b)
+  def strategy_2(self):
+    '''
+    Subset rules on every pair of frontier constraints sharing an unopened tile,
+    the unopened tiles of a constraint are a bitmask (bit y * width + x)
+    '''
+    if self.pattern_cache is not None:
+      return self.strategy_patterns()
+
+    masks = []
+    values = []
+    # unopened tile bit -> constraints around it
+    constraints_of = {}
+    for tiles, mines in self.frontier_constraints():
+      mask = 0
+      for x, y in tiles:
+        bit = y * self.width + x
+        mask |= 1 << bit
+        constraints_of.setdefault(bit, []).append(len(masks))
+      masks.append(mask)
+      values.append(mines)
+
+    safe_mask = 0
+    mine_mask = 0
+    for a in range(len(masks)):
+      partners = set()
+      mask = masks[a]
+      while mask:
+        low = mask & -mask
+        partners.update(constraints_of[low.bit_length() - 1])
+        mask ^= low
+
+      for b in partners:
+        if b <= a:
+          continue
+        # rule of strategy 2 (see the class comment), a against b then b against a
+        only_a = masks[a] & ~masks[b]
+        only_b = masks[b] & ~masks[a]
+        if values[a] - values[b] == only_a.bit_count():
+          mine_mask |= only_a
+          safe_mask |= only_b
+        elif values[b] - values[a] == only_b.bit_count():
+          mine_mask |= only_b
+          safe_mask |= only_a
+
+    # a tile found both ways comes from inconsistent flags, leave it
+    conflict = safe_mask & mine_mask
+    self.flag_tiles(mask_tiles(mine_mask & ~conflict, self.width))
+    self.open_tiles(mask_tiles(safe_mask & ~conflict, self.width))
+    return (safe_mask | mine_mask) & ~conflict == 0
+
+  def strategy_3(self):
+    '''
+    Flag and open every tile the frontier constraints decide, before a guess
+    '''
+    constraints = self.frontier_constraints()
 
-     
-      a_val = self.grid[tile_a[1]][tile_a[0]] - flag_a
-      b_val = self.grid[tile_b[1]][tile_b[0]] - flag_b
+    # when every unopened tile is on the frontier, the mines left are among them
+    unopened_tiles = self.search_tiles(open=False)
+    if self.bitboard is not None:
+      all_on_frontier = self.bitboard.hidden() == self.bitboard.frontier_unknowns()
+    else:
+      all_on_frontier = len(unopened_tiles) == len(self.frontier_unknowns)
+    if all_on_frontier:
+      constraints.append((tuple(unopened_tiles), self.bomb_left))
 
-      
-      no_move = self.set_operation(nfn_a, nfn_b, a_val, b_val) if a_val > b_val else self.set_operation(nfn_b, nfn_a, b_val, a_val)
+    safe_tiles, mine_tiles = solve_constraints(constraints)
+    self.flag_tiles(sorted(mine_tiles))
+    self.open_tiles(sorted(safe_tiles))
+    return not (safe_tiles or mine_tiles)
 
-    return no_move
-  
   def plot_win_rate(self):
     global GAME_PLAYED, GAME_WON
     GAME_PLAYED += 1
@@ -198,6 +432,10 @@ class logicPlayer(MineSweeper):
     '''
     Returns a list of tiles that are either opened or unopened
     '''
+    if self.bitboard is not None:
+      tiles = self.bitboard.tiles(self.bitboard.opened if open is True else self.bitboard.hidden())
+      return tiles[:1] if early_stop else tiles
+
     tiles = []
     for i in range(self.width):
       for j in range(self.height):
@@ -208,62 +446,64 @@ class logicPlayer(MineSweeper):
 
     return tiles
   
-  def numbered_tiles(self, tiles):
-    '''
-    Returns a list of tiles that are numbered
-    '''
-    return [tiles[i] for i in range(len(tiles)) if str(self.grid[tiles[i][1]][tiles[i][0]]).isdigit()]
-
-  def is_valid_tile(self, x, y):
-    return x >= 0 and x < self.width and y >= 0 and y < self.height
-  
   def face_click(self):
       '''
-      Override method to reset the game
+      Override method to reset the game, and start the next one
       '''
-      self.__init__()
-      self.play_simply()
+      self.end_profile()
+      self.reset()
+      self.start_game()
+      self.start_profile()
 
   def neighbors_and_flags(self, x, y, open=False):
     '''
-    Returns the number of neighbors and flags around a tile
+    Returns the neighbors in the given clicked state and the number of flags around a tile
+    (the tile itself is not counted), read from the neighbor table of the engine
     '''
     neighbors = []
     flags = 0
-    for i in range(x-1, x+2):
-      for j in range(y-1, y+2):
-        if self.is_valid_tile(i, j):
-          
-          if self.clicked_grid[j][i] is open:
-            neighbors.append((i,j))
+    for i, j in self.neighbors[y * self.width + x]:
+      if self.clicked_grid[j][i] is open:
+        neighbors.append((i,j))
 
-          if self.clicked_grid[j][i] == "F":
-            flags += 1
+      if self.clicked_grid[j][i] == "F":
+        flags += 1
     return neighbors, flags
   
+  def frontier_number_tiles(self):
+    '''
+    The number tiles on the frontier sorted by x then y, from the frontier mask with the bitboard
+    '''
+    if self.bitboard is not None:
+      return self.bitboard.tiles(self.bitboard.frontier_numbers())
+    return sorted(self.frontier_numbers)
+
+  def frontier_constraints(self):
+    '''
+    Returns one constraint per number tile on the frontier:
+    (unopened tiles around it, number of mines left among them)
+    '''
+    constraints = []
+    for x, y in self.frontier_number_tiles():
+      unopened_tiles, flag_count = self.neighbors_and_flags(x, y)
+      constraints.append((tuple(unopened_tiles), self.grid[y][x] - flag_count))
+    return constraints
+
   def flag_tiles(self, tiles):
     '''
-    Flag all the tiles in the list
+    Flag all the tiles in the list in one batch of moves
+    Returns the change delta of the engine (see MineSweeperEngine.apply_moves)
     '''
-    for tile in tiles:
-      self.right_click_register(tile[0], tile[1])
+    return self.apply_moves([("flag", x, y) for x, y in tiles])
 
 
   def open_tiles(self, tiles):
     '''
-    Open all the tiles in the list
+    Open all the tiles in the list in one batch of moves
+    Returns the change delta of the engine (see MineSweeperEngine.apply_moves)
     '''
-    for tile in tiles:
-      self.click_register(tile[0], tile[1])
-
+    return self.apply_moves([("open", x, y) for x, y in tiles])
 
-  def set_operation(self, bigger, smaller, bigger_val, smaller_val):
-    no_move = True
-    if bigger_val - smaller_val == len(bigger - smaller):
-      self.flag_tiles(bigger - smaller)
-      self.open_tiles(smaller - bigger)
-      no_move = False
-    return no_move
 
 if __name__ == "__main__":
   player = logicPlayer()
@@ -3,17 +3,17 @@
 #
 
 import datetime
-import random
 import pygame
 import sys
 
 sys.path.append('../')
+from board_engine import MineSweeperEngine
 
 #import sleep module
 from time import sleep
 
 
-class MineSweeper:
+class MineSweeper(MineSweeperEngine):
     """
     Classic MineSweeper remake 
     Game can be played by a human player, and AI player
@@ -36,6 +36,10 @@ class MineSweeper:
 
     80 x 45 , 742 mines
 
+    The rules (grid, clicks, win test) live in MineSweeperEngine,
+    this class adds the pygame view on top of it.
+    With headless=True no window is opened and every display call is skipped
+
     !!! When adjust the size of the game, also adjust the number of mines accordingly
     mine density in easy mode: 12.345%
     mine density in intermediate mode: 15.625%
@@ -44,22 +48,18 @@ class MineSweeper:
     
     
 
-    def __init__(self, width=80, height=45, bomb_count=742):
-        self.width = width
-        self.height = height
-        self.bomb_count = bomb_count
-
-        # ALGORITHM
-        self.grid = None
-        self.clicked_grid = [
-            [False for x in range(self.width)] for y in range(self.height)
-        ]
-        self.first_click = True
-        self.game_failed = False
-        self.game_won = False
-        self.bomb_left = self.bomb_count
-        self.timer = 0
-        self.start_time = None
+    # images loaded from disk, shared by every game
+    image_cache = {}
+
+    def __init__(self, width=80, height=45, bomb_count=742, headless=False, seed=None, bitboard=False):
+        super().__init__(width=width, height=height, bomb_count=bomb_count, seed=seed, bitboard=bitboard)
+
+        # headless: no window is created and nothing is drawn,
+        # only the rules engine runs
+        self.headless = headless
+        # drawing: False while frames are skipped (turbo mode of the AI players),
+        # the changed tiles are kept and drawn with the next frame
+        self.drawing = True
 
         # UI/PYGAME
         self.margin = 10
@@ -71,11 +71,14 @@ class MineSweeper:
         self.window_height = self.height * self.tile_size + self.margin * 3 + self.top_bar
         
         self.window_size = (self.window_width, self.window_height)
-        self.window = pygame.display.set_mode(self.window_size, 0, 0)
-        self.clock = pygame.time.Clock()
-        pygame.display.set_caption("Minesweeper")
         self.image_folder = "../img/"
-        pygame.display.set_icon(pygame.image.load(self.image_folder + "ico.png"))
+        self.window = None
+        self.clock = None
+        if not self.headless:
+            self.window = pygame.display.set_mode(self.window_size, 0, 0)
+            self.clock = pygame.time.Clock()
+            pygame.display.set_caption("Minesweeper")
+            pygame.display.set_icon(self.load_image(self.image_folder + "ico.png"))
 
         # IMAGES
         self.undiscovered_tile = self.image_folder + "undiscovered_tile.png"
@@ -105,6 +108,18 @@ class MineSweeper:
         # COLORS
         self.background_color = (180, 180, 180)
 
+    def reset(self, seed=None):
+        """
+        Start a new game on the same board size, keeping the window
+        """
+        super().reset(seed)
+
+        # RENDERING
+        # tiles changed since the last display_tiles,
+        # and window areas drawn since the last update_display
+        self.dirty_tiles = set()
+        self.dirty_rects = []
+
     def game_loop(self):
         """
         Game loop with different actions based on user input type
@@ -113,7 +128,7 @@ class MineSweeper:
         pygame.init()
         self.init_display()
         while True:
-            pygame.display.update()
+            self.update_display()
             self.clock.tick(60)
 
             self.human_play()
@@ -182,6 +197,7 @@ class MineSweeper:
         # right click
         elif button == 3:
             self.right_click_register(x, y)
+            self.display_tiles()
 
         self.win_test()
 
@@ -199,15 +215,41 @@ class MineSweeper:
         """
         Initialize the display by updating background, tiles and top bar
         """
+        if self.headless:
+            return
         self.display_background()
-        self.display_tiles()
+        self.display_tiles(full=True)
         self.display_top_bar()
 
+    def load_image(self, path):
+        """
+        Load an image from disk the first time it is needed,
+        next calls return the cached surface
+        """
+        if path not in MineSweeper.image_cache:
+            MineSweeper.image_cache[path] = pygame.image.load(path)
+        return MineSweeper.image_cache[path]
+
+    def blit(self, path, position):
+        """
+        Draw a cached image on the window and remember the area
+        to push to the screen at the next update_display
+        """
+        self.dirty_rects.append(self.window.blit(self.load_image(path), position))
+
+    def update_display(self):
+        """
+        Push to the screen only the areas drawn since the last update
+        """
+        if self.dirty_rects and self.drawing:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
     def display_background(self):
         """
         Update the background image
         """
-        self.window.blit(pygame.image.load(self.background), (0, 0))
+        self.blit(self.background, (0, 0))
 
     def display_face(self):
         """
@@ -220,8 +262,8 @@ class MineSweeper:
         else:
             face = self.face_happy
 
-        self.window.blit(
-            pygame.image.load(face),
+        self.blit(
+            face,
             (
                 self.window_width / 2 - self.face_size / 2,
                 self.margin + self.top_bar / 2 - self.face_size / 2,
@@ -257,14 +299,16 @@ class MineSweeper:
         """
         Update a single digit of either the bomb counter or the timer
         """
-        self.window.blit(pygame.image.load(self.counter[int(digit)]), (x, y))
+        self.blit(self.counter[int(digit)], (x, y))
 
     def display_top_bar(self):
         """
         Update the top bar, with timer, bomb counter and face
         """
+        if self.headless or not self.drawing:
+            return
         # reset the top bar
-        self.window.fill(
+        self.dirty_rects.append(self.window.fill(
             self.background_color,
             pygame.Rect(
                 (
@@ -272,7 +316,7 @@ class MineSweeper:
                     (self.window_width - self.margin * 2, self.top_bar),
                 )
             ),
-        )
+        ))
 
         self.display_face()
         self.display_bomb_counter()
@@ -290,7 +334,8 @@ class MineSweeper:
             self.timer = int(
                 (datetime.datetime.now() - self.start_time).total_seconds()
             )
-        self.display_timer_counter()
+        if not self.headless and self.drawing:
+            self.display_timer_counter()
 
     def tile_position(self, x, y):
         """
@@ -300,179 +345,77 @@ class MineSweeper:
         gui_y = self.margin * 2 + self.tile_size * y + self.top_bar
         return gui_x, gui_y
 
-    def display_tiles(self):
+    def tiles_changed(self, tiles):
         """
-        Update the display of every tiles on the grid
+        Remember the tiles changed by the engine,
+        they are drawn at the next display_tiles
         """
-        for x in range(self.width):
-            for y in range(self.height):
-                self.display_one_tile(x, y)
+        if self.headless:
+            return
+        self.dirty_tiles.update(tiles)
+
+    def display_tiles(self, full=False):
+        """
+        Update the display of the tiles changed since the last call,
+        or of every tiles on the grid when full is True
+        """
+        if self.headless or not (self.drawing or full):
+            return
+        if full:
+            tiles = [(x, y) for x in range(self.width) for y in range(self.height)]
+        else:
+            tiles = self.dirty_tiles
+        for x, y in tiles:
+            self.display_one_tile(x, y)
+        self.dirty_tiles = set()
 
     def display_one_tile(self, x, y):
         """
         Update the display of a single tile on the grid
         """
+        if self.headless:
+            return
         if self.clicked_grid[y][x] is True:
             if isinstance(self.grid[y][x], int):
                 # number tile
-                self.window.blit(
-                    pygame.image.load(self.number[self.grid[y][x]]),
-                    self.tile_position(x, y),
-                )
+                self.blit(self.number[self.grid[y][x]], self.tile_position(x, y))
 
             else:
                 # empty tile
-                self.window.blit(
-                    pygame.image.load(self.discovered_tile), self.tile_position(x, y)
-                )
+                self.blit(self.discovered_tile, self.tile_position(x, y))
 
         elif self.clicked_grid[y][x] == "F":
             # flagged tile
-            self.window.blit(pygame.image.load(self.flag), self.tile_position(x, y))
+            self.blit(self.flag, self.tile_position(x, y))
 
         elif self.clicked_grid[y][x] == "?":
             # question tile
-            self.window.blit(
-                pygame.image.load(self.question), self.tile_position(x, y)
-            )
+            self.blit(self.question, self.tile_position(x, y))
 
         else:
             # undiscovered tile
-            self.window.blit(
-                pygame.image.load(self.undiscovered_tile), self.tile_position(x, y)
-            )
+            self.blit(self.undiscovered_tile, self.tile_position(x, y))
 
     def show_bombs(self, exploded_x, exploded_y):
         """
         At the end of the game every bombs are shown to the player
         """
+        if self.headless:
+            return
+        # tiles changed since the last frame first, the bombs are drawn over them
+        for x, y in self.dirty_tiles:
+            self.display_one_tile(x, y)
         for x in range(self.width):
             for y in range(self.height):
                 if self.grid[y][x] == "*":
                     if self.clicked_grid[y][x] == "F" or self.clicked_grid[y][x] == "?":
-                        self.window.blit(
-                            pygame.image.load(self.flaged_bomb),
-                            self.tile_position(x, y),
-                        )
+                        self.blit(self.flaged_bomb, self.tile_position(x, y))
                     else:
-                        self.window.blit(
-                            pygame.image.load(self.bomb), self.tile_position(x, y)
-                        )
-
-        self.window.blit(
-            pygame.image.load(self.exploded_bomb),
-            self.tile_position(exploded_x, exploded_y),
-        )
+                        self.blit(self.bomb, self.tile_position(x, y))
 
-    def click_register(self, x, y):
-        """
-        When a user left click on the tile at position x, y
-        """
-        # Bombs are placed after the first click, preventing the
-        # player from clicking on a bomb at first click
-        if self.first_click:
-            self.first_click = False
-            self.generate_grid()
-            while self.grid[y][x] != " ":
-                self.generate_grid()
-            self.start_time = datetime.datetime.now()
-
-        if self.clicked_grid[y][x] is False:
-            
-            self.clicked_grid[y][x] = True
-            if self.grid[y][x] == "*":
-                self.game_failed = True
-                self.show_bombs(x, y)
-            elif self.grid[y][x] == " ":
-                self.discover_tiles(x, y)
-
-    def right_click_register(self, x, y):
-        """
-        When a user right click on the tile at position x, y
-        """
-        if self.clicked_grid[y][x] == "F":
-            self.clicked_grid[y][x] = "?"
-            self.bomb_left += 1
-        elif self.clicked_grid[y][x] == "?":
-            self.clicked_grid[y][x] = False
-        elif self.clicked_grid[y][x] is False:
-            self.clicked_grid[y][x] = "F"
-            self.bomb_left -= 1
-        self.display_one_tile(x, y)
-
-    def discover_tiles(self, x, y):
-        """
-        Will pass on all 8 adjacent tiles and
-        if they are either number or empty it will be recursive
-        """
-        for n in range(-1, 2):
-            for m in range(-1, 2):
-                u = x + m
-                v = y + n
-                if 0 <= v <= (self.height - 1) and 0 <= u <= (self.width - 1):
-                    if self.grid[v][u] == " " or isinstance(self.grid[v][u], int):
-                        self.click_register(u, v)
-
-    def win_test(self):
-        """
-        Test if player has won the game or not
-        and update self.game_won
-        """
-        if self.grid is not None:
-            for x in range(self.width):
-                for y in range(self.height):
-                    if (
-                        (self.grid[y][x] == "*" and self.clicked_grid[y][x] != "F")
-                        or (self.clicked_grid[y][x] == "F" and self.grid[y][x] != "*")
-                        or (self.clicked_grid[y][x] is False and self.grid[y][x] != "*")
-                    ):
-                        return
-            self.game_won = True
-
-    def generate_grid(self):
-        """
-        Generate a random grid filled with bomb and with numbers
-        """
-        self.grid = [[" " for x in range(self.width)] for y in range(self.height)]
-        self.place_bombs()
-        self.attribute_value()
-
-    def place_bombs(self):
-        """
-        Randomly place bombs on the grid
-        """
-        bomb_count = 0
-        while bomb_count != self.bomb_count:
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-            if self.grid[y][x] != "*":
-                self.grid[y][x] = "*"
-                bomb_count += 1
-
-    def attribute_value(self):
-        """
-        Place numbers on the grid based on the number of bomb in
-        the 8 adjacent tiles
-        """
-        for y in range(len(self.grid)):
-            for x in range(len(self.grid[y])):
-                if self.grid[y][x] != "*":
-                    c = 0
-                    for n in range(-1, 2):
-                        for m in range(-1, 2):
-                            u = x + m
-                            v = y + n
-                            if (
-                                0 <= u and u <= (self.width - 1)
-                                and
-                                0 <= v and v <= (self.height - 1) 
-                            ):
-                                if self.grid[v][u] == "*":
-                                    c += 1
-                    if c > 0:
-                        self.grid[y][x] = c
-                    else:
-                        self.grid[y][x] = " "
+        self.blit(self.exploded_bomb, self.tile_position(exploded_x, exploded_y))
+        # every changed tile is drawn, nothing left to redraw
+        self.dirty_tiles = set()
 
 
 if __name__ == "__main__":
@@ -3,16 +3,14 @@ import random
 import pygame
 from time import sleep
 import matplotlib.pyplot as plt
-import copy
 from prob_player import probabilityPlayer
 import numpy as np
-import csv
+import os
 import sys
 
 sys.path.append('../')
-from ANN_Model.ANN_model import sc
-
-from tensorflow.keras.models import load_model
+from ANN_Model.numpy_ann import NumpyANN
+from ANN_Model.scaler import load_scaler
 
 GAME_PLAYED = 0
 GAME_WON = 0
@@ -35,11 +33,44 @@ Approach:
 
 class neuralNetPlayer(probabilityPlayer):
 
-  def __init__(self):
-    super().__init__()
-    self.model = load_model('../ANN_Model/ann_model.h5')
+  def __init__(self, backend="auto", **kwargs):
+    '''
+    backend: "numpy" evaluates the exported ann_model.npz without TensorFlow,
+    "keras" loads ann_model.h5, "auto" picks numpy when the export exists
+    '''
+    super().__init__(**kwargs)
+    self.model, self.scaler = self.load_ann(backend)
     self.model.summary()
 
+  def load_ann(self, backend):
+    '''
+    Returns the model and the feature scaler of the chosen backend
+    '''
+    numpy_path = '../ANN_Model/ann_model.npz'
+    if backend == "numpy" or (backend == "auto" and os.path.exists(numpy_path)):
+      self.check_model_files([numpy_path])
+      model = NumpyANN(numpy_path)
+      return model, model
+
+    # TensorFlow is only imported when the Keras backend is used,
+    # the scaler was saved with the model by the training command (ANN_Model/ANN_model.py)
+    model_path, scaler_path = '../ANN_Model/ann_model.h5', '../ANN_Model/scaler.npz'
+    self.check_model_files([model_path, scaler_path])
+    from tensorflow.keras.models import load_model
+    return load_model(model_path), load_scaler(scaler_path)
+
+  @staticmethod
+  def check_model_files(paths):
+    '''
+    The model files are written by the training command, tell how to create the missing ones
+    '''
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+      raise FileNotFoundError(
+        "Missing {}: train the model first with `python ANN_model.py` from the ANN_Model folder "
+        "(it saves ann_model.h5, scaler.npz and ann_model.npz)".format(", ".join(missing))
+      )
+
   def play(self, no_move=False):
 
     self.strategy_1()
@@ -51,10 +82,13 @@ class neuralNetPlayer(probabilityPlayer):
       #sleep(1)
       self.display_tiles()
 
+    if no_move is True:
+      no_move = self.strategy_3()
+
     if no_move is True:
       # calculate the probability of each tile, pick the one with lowest probability of being a mine
       candidate_tiles = self.search_tiles(open=False)
-      heuristic_prob = self.local_prob_calc()
+      heuristic_prob = self.prob_calc()
     
       count = 1
       # keep picking the candidate tile with lowest probability until the neural network says it is a safe move
@@ -82,24 +116,6 @@ class neuralNetPlayer(probabilityPlayer):
       if first_lowest is None:
         first_lowest = candidate_tiles[random.randint(0, len(candidate_tiles)-1)]
       tile_to_pick = first_lowest
-      x, y = tile_to_pick
-
-      data = []
-      row = []
-      for i in range(x-1, x+2):
-        for j in range(y-1, y+2):
-          if i == x and j == y:
-            row.append(10)
-            continue
-          if self.is_valid_tile(i, j):
-            if self.clicked_grid[j][i] == "F":
-              row.append(9)
-            elif self.clicked_grid[j][i] == False:
-              row.append(10)
-            elif self.clicked_grid[j][i] == True:
-              row.append(self.grid[j][i]) 
-          else:
-            row.append(-1)
 
       """
       - Feed the configuration of lowest probability tile to the ANN to predict the chance of it having a mine
@@ -114,9 +130,19 @@ class neuralNetPlayer(probabilityPlayer):
       - however, we don't want to overestimate the probability of a tile being a mine, so we only update the heuristic
       with up to 2 back up (when the board is big enough)
       - Also provide open addressing
+
+      Every candidate is scored with its own neighborhood in a single call to the model,
+      then the attempts below only read the predictions
       """
+      scored_tiles = [
+        tile for tile in (first_lowest, second_chance_first_lowest, second_lowest, second_chance_second_lowest)
+        if tile is not None
+      ]
+      preds = dict(zip(scored_tiles, self.ann_predict(
+        [self.feature_row(tile[0], tile[1]) + [heuristic_prob[tile[1]][tile[0]]] for tile in scored_tiles]
+      )))
 
-      pred = self.ann_predict(copy.deepcopy(row), heuristic_prob[y][x], 1)
+      pred = preds[first_lowest]
 
       # !!! IMPORTANT: always check for availability of candidate tiles, chances are that there is none such exists
       # and we are actually at the end of the game
@@ -125,34 +151,31 @@ class neuralNetPlayer(probabilityPlayer):
       if pred and second_chance_first_lowest is not None:
         print("Second chance for the #{} lowest probability tile".format(1))
         tile_to_pick = second_chance_first_lowest
-        x, y = tile_to_pick
-
-        pred = self.ann_predict(copy.deepcopy(row), heuristic_prob[y][x], 1)
+        pred = preds[tile_to_pick]
 
 
       # if second fail then we need to move on to the backups
 
       if pred and second_lowest is not None:
         print("Back up to the second lowest probability tile")
-        
         tile_to_pick = second_lowest
-        x, y = tile_to_pick
-
-        pred = self.ann_predict(copy.deepcopy(row), heuristic_prob[y][x], 2)
+        pred = preds[tile_to_pick]
 
         # try second chance of the 2nd tier of lowest probability
         if pred and second_chance_second_lowest is not None:
           print("Second chance for the #{} lowest probability tile".format(2))
           tile_to_pick = second_chance_second_lowest
-          x, y = tile_to_pick
-
-          pred = self.ann_predict(copy.deepcopy(row), heuristic_prob[y][x], 2)
+          pred = preds[tile_to_pick]
 
         # if all other attempts fail then we need to move on to the third lowest probability tile
         if pred and third_lowest is not None:
             print("Back up to the third lowest probability tile")
             tile_to_pick = third_lowest
-      
+
+      x, y = tile_to_pick
+      data = []
+      row = self.feature_row(x, y)
+
       print("Will pick tile at: {}, with probability: {} ".format(tile_to_pick, heuristic_prob[tile_to_pick[1]][tile_to_pick[0]]))
       self.click_register(tile_to_pick[0], tile_to_pick[1])
 
@@ -160,10 +183,11 @@ class neuralNetPlayer(probabilityPlayer):
       row.append(1 if self.game_failed else 0)
       data.append(row)
 
-      self.csv_writer(data)
+      self.data_writer(data)
         
     self.display_top_bar()
     self.win_test()
+    return no_move
 
   def get_i_th_lowest_prob_tile(self, candidates, h_prob, low_bound_tile, count):
     '''
@@ -197,19 +221,16 @@ class neuralNetPlayer(probabilityPlayer):
     return None
     
 
-  def ann_predict(self, row, curr_low_prob, count):
+  def ann_predict(self, rows):
     '''
-    Predict the probability of the i_th lowest probability tile to have a mine
-    by the ANN model
+    Predict for every row (neighborhood of a tile + its heuristic probability)
+    if the tile has a mine, with a single call to the ANN model
+    The rows are scaled like the training set the model was fitted on
     '''
-    print("Predicting #{} lowest probability tile to have a mine ...".format(count))
-
-    row.append(curr_low_prob)
-    probed_data = [row]
-    print(probed_data)
+    print("Predicting {} candidate tiles to have a mine ...".format(len(rows)))
 
-    pred = (self.model.predict(np.array(probed_data)) > 0.5)[0][0]
-    return pred
+    pred = self.model.predict(self.scaler.transform(np.array(rows, dtype=float)), verbose=0) > 0.5
+    return [bool(p) for p in pred[:, 0]]
 
 if __name__ == "__main__":
 
@@ -0,0 +1,238 @@
+#
+# Memoized deductions of the local patterns around the frontier
+#
+
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
+
+'''
+Pattern Cache:
+  The deductions around a number tile only depend on the 5x5 window centered on it:
+  the 3x3 center holds the number tiles whose whole neighborhood is in the window,
+  the rules of strategies 1 and 2 on their constraints give the safe tiles and the mines
+  (the whole frontier is solved by strategy 3 before any guess, see constraints.py)
+
+  The players encode a window as 25 codes, row by row:
+    number of an opened tile (0 when empty), 9: flag, 10: unknown, 11: question mark, -1: out of bound
+  (the numbers of the outer ring do not matter, their neighborhood is not in the window,
+  they can be given as 12: opened)
+  A player keeps the code of every tile in a flat list ending with -1,
+  window_tables reads the 25 codes of a window from it in one call
+
+  The key of the cache only keeps what the constraints see:
+    unknown tiles, the mines left around each center number with unknown neighbors (number - flags),
+    and 12 (blocked) for every other tile, flagged, opened or out of bound alike
+  The same pattern rotated or reflected gives the same deductions, rotated or reflected,
+  so the key is the smallest of the 8 symmetric encodings
+  and the results are stored as window positions of that canonical key
+
+  Canonicalising costs 8 encodings, so a window is first looked up in a second LRU
+  keyed before symmetries, with the results in its own positions: only a miss there is canonicalised
+
+  The cache is a LRU of bounded size shared by every player of a process (see shared_cache),
+  so the patterns seen in a game are reused in the next games of a simulation worker
+'''
+
+SIZE = 5
+FLAG, UNKNOWN, MARK, OPENED, OUT = 9, 10, 11, 12, -1
+BLOCKED = OPENED
+CENTER = [r * SIZE + c for r in range(1, SIZE - 1) for c in range(1, SIZE - 1)]
+
+
+def symmetries():
+    """
+    For each of the 8 rotations/reflections, the window position read for every position
+    """
+    last = SIZE - 1
+    maps = [
+        lambda r, c: (r, c), lambda r, c: (c, last - r),
+        lambda r, c: (last - r, last - c), lambda r, c: (last - c, r),
+        lambda r, c: (r, last - c), lambda r, c: (last - r, c),
+        lambda r, c: (c, r), lambda r, c: (last - c, last - r),
+    ]
+    result = []
+    for source in maps:
+        positions = []
+        for i in range(SIZE * SIZE):
+            r, c = source(i // SIZE, i % SIZE)
+            positions.append(r * SIZE + c)
+        result.append(positions)
+    return result
+
+
+SYMMETRIES = symmetries()
+GETTERS = [itemgetter(*positions) for positions in SYMMETRIES]
+
+
+def neighborhood(i):
+    r, c = divmod(i, SIZE)
+    return [n * SIZE + m for n in range(r - 1, r + 2) for m in range(c - 1, c + 2) if n * SIZE + m != i]
+
+
+NEIGHBORHOODS = {i: neighborhood(i) for i in CENTER}
+NEIGHBOR_GETTERS = [(i, itemgetter(*NEIGHBORHOODS[i])) for i in CENTER]
+
+
+@lru_cache(maxsize=None)
+def window_tables(width, height, size=SIZE):
+    """
+    For every tile (index y * width + x) of a board, a getter of the items of the size x size window
+    centered on it, row by row, from a list of one item per tile followed by the item out of the board
+    (OUT for the codes): the positions out of the board read the last item
+    """
+    half = size // 2
+    getters = []
+    for y in range(height):
+        for x in range(width):
+            positions = [
+                v * width + u if 0 <= u < width and 0 <= v < height else -1
+                for v in range(y - half, y + half + 1) for u in range(x - half, x + half + 1)
+            ]
+            getters.append(itemgetter(*positions))
+    return getters
+
+
+def tile_code(state, value):
+    """
+    Code of a tile from its clicked state and its value in the grid (only read when opened)
+    """
+    if state is True:
+        return value if isinstance(value, int) else 0
+    if state is False:
+        return UNKNOWN
+    return FLAG if state == "F" else MARK
+
+
+def reduce_window(codes):
+    """
+    Key of an encoded window before symmetries: unknown tiles, mines left around the center numbers,
+    everything else blocked
+    """
+    key = [UNKNOWN if code == UNKNOWN else BLOCKED for code in codes]
+    for i, around in NEIGHBOR_GETTERS:
+        value = codes[i]
+        if not 0 <= value <= 8:
+            continue
+        around = around(codes)
+        if UNKNOWN in around:
+            key[i] = value - around.count(FLAG)
+    return tuple(key)
+
+
+def solve_window(key):
+    """
+    Positions of the safe tiles and of the mines in a window key:
+    the rules of strategies 1 and 2 on the center numbers, applied again with the tiles found
+    until nothing new is found
+    """
+    constraints = []
+    for i in CENTER:
+        if key[i] in (UNKNOWN, BLOCKED):
+            continue
+        mask = 0
+        for j in NEIGHBORHOODS[i]:
+            if key[j] == UNKNOWN:
+                mask |= 1 << j
+        constraints.append((mask, key[i]))
+
+    safe = mines = 0
+    while constraints:
+        found_safe = found_mines = 0
+        for mask, value in constraints:
+            if value == 0:
+                found_safe |= mask
+            elif value == mask.bit_count():
+                found_mines |= mask
+        for a, (mask_a, value_a) in enumerate(constraints):
+            for mask_b, value_b in constraints[a + 1:]:
+                if not mask_a & mask_b:
+                    continue
+                only_a = mask_a & ~mask_b
+                only_b = mask_b & ~mask_a
+                if value_a - value_b == only_a.bit_count():
+                    found_mines |= only_a
+                    found_safe |= only_b
+                elif value_b - value_a == only_b.bit_count():
+                    found_mines |= only_b
+                    found_safe |= only_a
+        if not found_safe | found_mines:
+            break
+        if found_safe & found_mines:
+            # inconsistent numbers (wrong flags), nothing is deduced
+            return (), ()
+        safe |= found_safe
+        mines |= found_mines
+
+        # substitute the tiles found, the constraints left without unknowns are dropped
+        known = safe | mines
+        constraints = [
+            (mask & ~known, value - (mask & mines).bit_count())
+            for mask, value in constraints if mask & ~known
+        ]
+
+    return (
+        tuple(i for i in range(SIZE * SIZE) if safe >> i & 1),
+        tuple(i for i in range(SIZE * SIZE) if mines >> i & 1),
+    )
+
+
+class PatternCache:
+    """
+    LRU of the deductions of canonical windows,
+    in front of it a LRU of the windows already seen
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.windows = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, codes):
+        """
+        Deductions of an encoded window: (safe positions, mine positions) in this window
+        """
+        reduced = reduce_window(codes)
+        result = self.windows.get(reduced)
+        if result is not None:
+            self.hits += 1
+            self.windows.move_to_end(reduced)
+            return result
+
+        keys = [getter(reduced) for getter in GETTERS]
+        key = min(keys)
+        positions = SYMMETRIES[keys.index(key)]
+        canonical = self.entries.get(key)
+        if canonical is None:
+            self.misses += 1
+            canonical = solve_window(key)
+            self.store(self.entries, key, canonical)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        safe, mines = canonical
+        result = [positions[i] for i in safe], [positions[i] for i in mines]
+        self.store(self.windows, reduced, result)
+        return result
+
+    def store(self, entries, key, result):
+        entries[key] = result
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+
+# cache of the current process, see shared_cache
+_shared = None
+
+
+def shared_cache(maxsize=100000):
+    """
+    The pattern cache of this process, created on first use
+    """
+    global _shared
+    if _shared is None:
+        _shared = PatternCache(maxsize)
+    return _shared
@@ -0,0 +1,225 @@
+#
+# Exact mine probabilities of the unopened tiles
+#
+
+from math import comb
+
+import numpy as np
+
+'''
+Probability Engine:
+  Every number tile on the frontier gives a constraint:
+    sum of the mines on its unopened neighbors = number - flags around it
+
+  1. Split the frontier into independent components,
+  two unopened tiles are in the same component if a chain of constraints links them
+
+  2. Enumerate every mine assignment of each component with backtracking,
+  a branch is cut as soon as one of its constraints can no longer be met.
+  For each total number of mines k in the component, keep the number of
+  solutions and how many of them put a mine on each tile
+
+  3. Combine the components with the global number of mines left:
+  the unopened tiles away from the frontier (interior) share the remaining mines,
+  so a combination with m mines on the frontier weighs comb(interior, mines_left - m)
+'''
+
+
+class EnumerationLimit(Exception):
+    """
+    Raised when a component needs more backtracking steps than allowed
+    """
+
+
+def split_components(constraints):
+    """
+    Group the constraints sharing unopened tiles together
+    Returns a list of (tiles, constraints) per independent component
+    """
+    parent = {}
+
+    def find(tile):
+        while parent[tile] != tile:
+            parent[tile] = parent[parent[tile]]
+            tile = parent[tile]
+        return tile
+
+    for tiles, _ in constraints:
+        for tile in tiles:
+            parent.setdefault(tile, tile)
+        for tile in tiles[1:]:
+            root_a, root_b = find(tiles[0]), find(tile)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    components = {}
+    for tiles, mines in constraints:
+        if len(tiles) == 0:
+            continue
+        root = find(tiles[0])
+        if root not in components:
+            components[root] = ([], [])
+        components[root][1].append((tiles, mines))
+
+    for tile in parent:
+        components[find(tile)][0].append(tile)
+
+    return list(components.values())
+
+
+def enumerate_component(tiles, constraints, mines_left, max_steps):
+    """
+    Enumerate every mine assignment of a component that meets all its constraints
+    Returns a dict: number of mines k -> (number of solutions, solutions count with a mine per tile)
+    """
+    # visit the tiles constraint by constraint, so constraints get complete early
+    order = []
+    seen = set()
+    for constraint_tiles, _ in constraints:
+        for tile in constraint_tiles:
+            if tile not in seen:
+                seen.add(tile)
+                order.append(tile)
+    index = {tile: i for i, tile in enumerate(order)}
+
+    target = [mines for _, mines in constraints]
+    placed = [0] * len(constraints)
+    free = [len(constraint_tiles) for constraint_tiles, _ in constraints]
+    tile_constraints = [[] for _ in order]
+    for c, (constraint_tiles, _) in enumerate(constraints):
+        for tile in constraint_tiles:
+            tile_constraints[index[tile]].append(c)
+
+    assignment = np.zeros(len(order), dtype=np.int64)
+    solutions = {}
+    steps = [0]
+
+    def assign(i, value):
+        ok = True
+        for c in tile_constraints[i]:
+            free[c] -= 1
+            placed[c] += value
+            if placed[c] > target[c] or placed[c] + free[c] < target[c]:
+                ok = False
+        return ok
+
+    def unassign(i, value):
+        for c in tile_constraints[i]:
+            free[c] += 1
+            placed[c] -= value
+
+    def backtrack(i, total):
+        steps[0] += 1
+        if steps[0] > max_steps:
+            raise EnumerationLimit()
+
+        if i == len(order):
+            if total not in solutions:
+                solutions[total] = [0, np.zeros(len(order), dtype=np.int64)]
+            solutions[total][0] += 1
+            solutions[total][1] += assignment
+            return
+
+        for value in (0, 1):
+            if total + value > mines_left:
+                break
+            assignment[i] = value
+            if assign(i, value):
+                backtrack(i + 1, total + value)
+            unassign(i, value)
+        assignment[i] = 0
+
+    backtrack(0, 0)
+
+    # back to the order of the tiles given by the caller
+    position = [index[tile] for tile in tiles]
+    return {
+        k: (count, [int(tile_count[p]) for p in position])
+        for k, (count, tile_count) in solutions.items()
+    }
+
+
+def convolve(a, b):
+    """
+    Product of two polynomials given by their list of coefficients
+    """
+    result = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+
+def exact_probabilities(constraints, unopened_tiles, mines_left, shape, max_steps=200000):
+    """
+    Exact probability of every unopened tile to hold a mine
+
+    constraints: list of (tuple of unopened tiles, mines left among them), one per frontier number
+    unopened_tiles: every unopened (not flagged) tile of the board
+    Returns an array of the given (height, width) shape, 0 on the other tiles,
+    or None when the constraints have no solution or the enumeration is too long
+    """
+    components = split_components(constraints)
+    frontier = set()
+    for tiles, _ in components:
+        frontier.update(tiles)
+    interior = [tile for tile in unopened_tiles if tile not in frontier]
+    n_interior = len(interior)
+
+    try:
+        solved = [
+            (tiles, enumerate_component(tiles, component_constraints, mines_left, max_steps))
+            for tiles, component_constraints in components
+        ]
+    except (EnumerationLimit, RecursionError):
+        return None
+
+    # weights[k]: number of solutions of a component with k mines, as a polynomial
+    polys = []
+    for _, solutions in solved:
+        poly = [0] * (max(solutions) + 1 if solutions else 1)
+        for k, (count, _) in solutions.items():
+            poly[k] = count
+        polys.append(poly)
+
+    def interior_weight(m):
+        # ways to place the mines not on the frontier in the interior
+        rest = mines_left - m
+        return comb(n_interior, rest) if 0 <= rest <= n_interior else 0
+
+    total_poly = [1]
+    for poly in polys:
+        total_poly = convolve(total_poly, poly)
+    total = sum(count * interior_weight(m) for m, count in enumerate(total_poly))
+    if total == 0:
+        return None
+
+    prob = np.zeros(shape)
+    for j, (tiles, solutions) in enumerate(solved):
+        others = [1]
+        for i, poly in enumerate(polys):
+            if i != j:
+                others = convolve(others, poly)
+
+        mine_weight = [0] * len(tiles)
+        for k, (_, tile_count) in solutions.items():
+            # weight of the rest of the board when this component holds k mines
+            weight = sum(count * interior_weight(k + m) for m, count in enumerate(others))
+            if weight:
+                for t, count in enumerate(tile_count):
+                    mine_weight[t] += count * weight
+
+        for (x, y), weight in zip(tiles, mine_weight):
+            prob[y][x] = weight / total
+
+    if n_interior > 0:
+        # expected number of mines in the interior, shared evenly
+        interior_mines = sum(
+            count * interior_weight(m) * (mines_left - m) for m, count in enumerate(total_poly)
+        )
+        interior_prob = interior_mines / (total * n_interior)
+        for x, y in interior:
+            prob[y][x] = interior_prob
+
+    return prob
@@ -5,9 +5,10 @@ from time import sleep
 import matplotlib.pyplot as plt
 import copy
 from logic_player import logicPlayer
+from prob_engine import exact_probabilities
 import numpy as np
-import csv
 import sys
+from data_sink import DataSink
 
 sys.path.append('../')
 
@@ -24,45 +25,96 @@ Approach:
   greedily pick the tile with lowest probability of being a mine
   3. use ANN to dictate should the probability of a tile being a mine is reasonable to make progress
   or should we back up with second to lowest probability tile
+
+  exact_prob=True replaces the local heuristic by the exact probabilities of prob_engine,
+  the heuristic stays the default so the collected data stays comparable
+
+  The guesses are buffered and saved as .npy shards in data/shards (see data_sink.py),
+  record_data=False disables the collection
 '''
 
 class probabilityPlayer(logicPlayer):
 
+  def __init__(self, exact_prob=False, record_data=True, **kwargs):
+    super().__init__(**kwargs)
+    self.exact_prob = exact_prob
+    self.record_data = record_data
+    self.data_sink = None
+
+  def prob_calc(self):
+    '''
+    Probability of all unopened tiles to be a mine,
+    exact when enabled and solvable in time, otherwise the local heuristic
+    '''
+    if self.exact_prob:
+      prob = self.exact_prob_calc()
+      if prob is not None:
+        return prob
+    return self.local_prob_calc()
+
+  def exact_prob_calc(self):
+    # exact probability from the frontier constraints and the number of mines left
+    # None if the enumeration is too long or the flags are inconsistent
+    return exact_probabilities(
+      self.frontier_constraints(), self.search_tiles(), self.bomb_left, (self.height, self.width)
+    )
+
   def local_prob_calc(self):
-    # calculate the probability of all unopened tiles, by taken into account the number of mines 
-    # and the number of unopened tiles around it
-    # matrix is of size (height, width)
+    '''
+    Probability of all unopened tiles to be a mine, by taking into account the number of mines
+    and the number of unopened tiles around each opened neighbor, as a matrix of size (height, width)
+
+    Tile on the frontier: average over its opened neighbors of (number - flags) / unopened tiles around it
+    Other unopened tiles: number of mines left / number of unopened tiles
+
+    Computed with whole board arrays: the ratio of every opened number,
+    summed onto its neighbors with shifted copies, then divided by the count of opened neighbors.
+    The shifted copies are added in the order of the neighbor scan (column by column from the top left),
+    so every float is added in the same order as tile by tile and the result is bit-identical
+    '''
+    opened = np.array([[state is True for state in row] for row in self.clicked_grid])
+    unknown = np.array([[state is False for state in row] for row in self.clicked_grid])
+    flags = np.array([[state == "F" for state in row] for row in self.clicked_grid])
+    # numbers of the opened tiles only, reading the grid of an unopened tile is cheating
+    numbers = np.array([
+      [value if state is True and isinstance(value, int) else 0 for state, value in zip(state_row, value_row)]
+      for state_row, value_row in zip(self.clicked_grid, self.grid)
+    ])
+
+    # mines left / unopened tiles around every opened number, 0 elsewhere
+    unknown_around = self.neighbor_sum(unknown)
+    ratios = np.zeros((self.height, self.width))
+    has_ratio = (numbers > 0) & (unknown_around > 0)
+    ratios[has_ratio] = (numbers - self.neighbor_sum(flags))[has_ratio] / unknown_around[has_ratio]
+
+    padded = np.pad(ratios, 1)
+    total = np.zeros((self.height, self.width))
+    for i in range(3):
+      for j in range(3):
+        if i != 1 or j != 1:
+          total += padded[j:j + self.height, i:i + self.width]
+
+    opened_around = self.neighbor_sum(opened)
+    frontier = unknown & (opened_around > 0)
+    interior = unknown & ~frontier
+
     heuristic_prob = np.zeros((self.height, self.width))
-    unopened_tiles = self.search_tiles()
-    for u_tile in unopened_tiles:
-      count = 0
-      neighbors, flags = self.neighbors_and_flags(u_tile[0], u_tile[1], open=True)
-
-      # if the tile is not surrounded by any opened tiles, 
-      # then the probability of it being a mine is the number of mines left / number of unopened tiles
-
-      if len(neighbors) == 0:
-        heuristic_prob[u_tile[1]][u_tile[0]] = self.bomb_left / len(unopened_tiles)
-        count += 1
-
-      else:
-        for neighbor in neighbors:
-          # get the number of unopened tiles around the neighbor
-          n_neighbors, n_flags = self.neighbors_and_flags(neighbor[0], neighbor[1], open=False)
-          mine_left = self.grid[neighbor[1]][neighbor[0]] - n_flags
-          n_unopened_tiles = len(n_neighbors)
-
-          # probability of the unopened depends on the number indicated on the neighbor tile and known mines and unopened tiles around it
-          heuristic_prob[u_tile[1]][u_tile[0]] += mine_left / n_unopened_tiles
-          # also increase the incident count of the unopened tile
-          count += 1
-
-      # normalize the probability
-      heuristic_prob[u_tile[1]][u_tile[0]] /= count
-        
+    heuristic_prob[frontier] = total[frontier] / opened_around[frontier]
+    heuristic_prob[interior] = self.bomb_left / int(unknown.sum())
     return heuristic_prob
 
-  
+  def neighbor_sum(self, layer):
+    '''
+    Sum of the layer over the 8 neighbors of every tile, as integers
+    '''
+    padded = np.pad(layer.astype(int), 1)
+    total = np.zeros((self.height, self.width), dtype=int)
+    for i in range(3):
+      for j in range(3):
+        if i != 1 or j != 1:
+          total += padded[j:j + self.height, i:i + self.width]
+    return total
+
   def play(self, no_move=False):
       
 
@@ -75,10 +127,13 @@ class probabilityPlayer(logicPlayer):
       # sleep(1)
       self.display_tiles()
 
+    if no_move is True:
+      no_move = self.strategy_3()
+
     if no_move is True:
       # calculate the probability of each tile, pick the one with lowest probability of being a mine
       candidate_tiles = self.search_tiles(open=False)
-      heuristic_prob = self.local_prob_calc()
+      heuristic_prob = self.prob_calc()
     
       
       # pick the candidate tile with lowest probability
@@ -101,23 +156,8 @@ class probabilityPlayer(logicPlayer):
       # should use different name for different configuration to collect suitable data
       # 9: mine, 0: empty, -1: out of bound, 10 : unknown
       data = []
-      row = []
-      for i in range(x-1, x+2):
-        for j in range(y-1, y+2):
-          if i == x and j == y:
-            row.append(10)
-            continue
-          if self.is_valid_tile(i, j):
-            if self.clicked_grid[j][i] == "F":
-              row.append(9)
-            elif self.clicked_grid[j][i] == False:
-              row.append(10)
-            elif self.clicked_grid[j][i] == True:
-              row.append(self.grid[j][i]) 
-          else:
-            row.append(-1)
+      row = self.feature_row(x, y)
 
-      
       #print("Row checking before model: {}".format(row))
       print("Will pick tile at: {}, with probability: {} ".format(tile_to_pick, heuristic_prob[y][x]))
       self.click_register(x,y)
@@ -126,20 +166,44 @@ class probabilityPlayer(logicPlayer):
       row.append(1 if self.game_failed else 0)
       data.append(row)
 
-      self.csv_writer(data)
+      self.data_writer(data)
         
     self.display_top_bar()
     self.win_test()
-
-  def csv_writer(self, data):
-      # write the data to csv file
-      dir = '../data/'
-      file_name = 'data_80_45.csv'
-      datapath = dir + file_name
-
-      with open(datapath, 'a') as f:
-        writer = csv.writer(f)
-        writer.writerows(data)
+    return no_move
+
+  def feature_row(self, x, y):
+    '''
+    Neighborhood of the tile at x, y as ANN features, column by column from the top left,
+    the tile itself included (always unknown)
+    9: flag, number of the tile if opened, -1: out of bound, 10: unknown
+    '''
+    row = []
+    for k, index in enumerate(self.padded_neighbors[y * self.width + x]):
+      if k == 4:
+        row.append(10)
+      if index < 0:
+        row.append(-1)
+        continue
+      j, i = divmod(index, self.width)
+      if self.clicked_grid[j][i] == "F":
+        row.append(9)
+      elif self.clicked_grid[j][i] == False:
+        row.append(10)
+      elif self.clicked_grid[j][i] == True:
+        row.append(self.grid[j][i])
+    return row
+
+  def data_writer(self, data):
+    '''
+    Buffer the rows of training data, written to disk in bulk by the data sink
+    the shards are named after the configuration of the game, data of different sizes stay apart
+    '''
+    if not self.record_data:
+      return
+    if self.data_sink is None:
+      self.data_sink = DataSink('../data/shards/', prefix='data_{}_{}'.format(self.width, self.height))
+    self.data_sink.write(data)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,193 @@
+#
+# Per-phase timing of the AI players
+#
+
+import json
+import time
+from functools import wraps
+
+'''
+Profiler:
+  Wraps the methods of one player instance (its phases) with a timer,
+  nothing is wrapped and nothing is timed on players without a profiler attached
+
+  For every game (one play_game call) it records:
+    the duration of every call of every phase,
+    the duration of every move (one play call) and the time spent in each phase during that move
+
+  Phases are timed inclusively: strategy_3 runs inside play, so its time is counted in both.
+  The records are exported as JSON lines, one line per game with the count, total
+  and percentiles of each phase, then one line summing the whole run
+
+  Example (from the AI_Player folder):
+    python simulate.py --player prob --preset expert --games 100 --profile profile.jsonl
+
+  The windowed players take the same option, play_simply(profile="profile.jsonl"):
+  every game is written as soon as it ends (display_tiles then times the real drawing),
+  and the line of the whole run when the window is closed
+'''
+
+PHASES = (
+    "play", "strategy_1", "strategy_2", "strategy_3",
+    "local_prob_calc", "exact_prob_calc", "ann_predict",
+    "display_tiles", "win_test",
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(ordered, q):
+    """
+    Nearest rank percentile of a sorted list
+    """
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def phase_stats(samples):
+    """
+    Count, total and latency percentiles of a list of durations in seconds
+    """
+    ordered = sorted(samples)
+    stats = {
+        "calls": len(ordered),
+        "total_s": sum(ordered),
+        "mean_s": sum(ordered) / len(ordered) if ordered else 0.0,
+        "max_s": ordered[-1] if ordered else 0.0,
+    }
+    for q in PERCENTILES:
+        stats["p{}_s".format(q)] = percentile(ordered, q)
+    return stats
+
+
+class Profiler:
+    """
+    Timer of the phases of a player, see attach
+    """
+
+    def __init__(self):
+        # raw records of the finished games
+        self.games = []
+        self.current = None
+        self.move = None
+
+    def attach(self, player, phases=PHASES):
+        """
+        Time the given methods of the player, and its games through play_game
+        Methods the player does not have are skipped
+        """
+        for phase in phases:
+            if hasattr(player, phase):
+                setattr(player, phase, self.timed(phase, getattr(player, phase)))
+        player.play_game = self.timed_game(player.play_game)
+        player.profiler = self
+
+    def timed(self, phase, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            # a move is a call to play, the other phases are counted in the current one
+            new_move = phase == "play" and self.move is None
+            if new_move:
+                self.move = {}
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if self.current is not None:
+                    self.current["phases"].setdefault(phase, []).append(elapsed)
+                    if new_move:
+                        self.current["moves"].append({"seconds": elapsed, "phases": self.move})
+                if self.move is not None and not new_move:
+                    self.move[phase] = self.move.get(phase, 0.0) + elapsed
+                if new_move:
+                    self.move = None
+        return wrapper
+
+    def timed_game(self, play_game):
+        @wraps(play_game)
+        def wrapper(*args, **kwargs):
+            self.start_game()
+            start = time.perf_counter()
+            try:
+                return play_game(*args, **kwargs)
+            finally:
+                self.end_game(time.perf_counter() - start)
+        return wrapper
+
+    def start_game(self):
+        self.current = {"seconds": 0.0, "phases": {}, "moves": []}
+        self.game_start = time.perf_counter()
+
+    def end_game(self, seconds=None):
+        """
+        Store the record of the current game and return it
+        seconds: duration of the game, by default the time since start_game
+        """
+        if seconds is None:
+            seconds = time.perf_counter() - self.game_start
+        record = self.current
+        record["seconds"] = seconds
+        self.games.append(record)
+        self.current = None
+        return record
+
+
+def game_summary(record, game=None):
+    """
+    JSON ready summary of the raw record of one game
+    """
+    moves = [move["seconds"] for move in record["moves"]]
+    return {
+        "type": "game",
+        "game": game,
+        "seconds": record["seconds"],
+        "moves": len(moves),
+        "move": phase_stats(moves),
+        "phases": {phase: phase_stats(samples) for phase, samples in sorted(record["phases"].items())},
+        "per_move": [
+            {phase: seconds for phase, seconds in sorted(move["phases"].items())}
+            for move in record["moves"]
+        ],
+    }
+
+
+def run_summary(records):
+    """
+    Summary of a whole run, the samples of every game together
+    """
+    phases = {}
+    moves = []
+    for record in records:
+        moves += [move["seconds"] for move in record["moves"]]
+        for phase, samples in record["phases"].items():
+            phases.setdefault(phase, []).extend(samples)
+    return {
+        "type": "run",
+        "games": len(records),
+        "game": phase_stats([record["seconds"] for record in records]),
+        "move": phase_stats(moves),
+        "phases": {phase: phase_stats(samples) for phase, samples in sorted(phases.items())},
+    }
+
+
+def append_jsonl(path, summary):
+    """
+    Add one summary line (see game_summary and run_summary) at the end of a JSON lines file
+    """
+    with open(path, "a") as f:
+        f.write(json.dumps(summary) + "\n")
+
+
+def write_jsonl(path, records, games=None):
+    """
+    One line per game, in the given game order, then the summary of the run
+    """
+    if games is None:
+        games = range(len(records))
+    with open(path, "w") as f:
+        for game, record in zip(games, records):
+            f.write(json.dumps(game_summary(record, game)) + "\n")
+        f.write(json.dumps(run_summary(records)) + "\n")
@@ -0,0 +1,201 @@
+#
+# Non-interactive batch simulator for the AI players
+#
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.append('../')
+from board_engine import decode_board, encode_board, load_boards, save_boards
+from profiler import Profiler, write_jsonl
+
+'''
+Run many headless games of one AI player and report its statistics:
+win rate, moves per game, guesses per game and games per second
+
+Games are spread across a pool of worker processes, each worker builds its
+player once and resets it between games. Game i always plays with the seed
+(seed, i), so a run can be repeated with the same boards.
+The boards played can be saved (--save-boards) and replayed exactly (--boards)
+
+Example (from the AI_Player folder):
+  python simulate.py --player prob --preset expert --games 1000 --workers 8 --seed 0
+  python simulate.py --player logic --preset expert --boards expert_boards.bin
+  python simulate.py --player prob --preset expert --profile profile.jsonl (timing of every phase, see profiler.py)
+'''
+
+# name: (width, height, bomb_count)
+PRESETS = {
+    "beginner": (9, 9, 10),
+    "intermediate": (16, 16, 40),
+    "expert": (30, 16, 99),
+    "custom": (80, 45, 742),
+}
+
+PLAYERS = ("logic", "prob", "neural")
+
+# player of the current worker process, built once by init_worker
+_player = None
+
+
+def make_player(name, preset, exact_prob=False, record_data=True, bitboard=False, pattern_cache=False):
+    """
+    Build a headless player for the given board preset
+    Players are imported here so the neural network is only loaded when needed
+    record_data: save the guesses of the prob/neural players as training data
+    bitboard: keep the board as bitsets too (see bitboard.py)
+    pattern_cache: deductions of strategy 2 from the pattern cache of the process (see pattern_cache.py)
+    """
+    width, height, bomb_count = PRESETS[preset]
+    if name == "logic":
+        from logic_player import logicPlayer
+        return logicPlayer(
+            width=width, height=height, bomb_count=bomb_count, headless=True, bitboard=bitboard,
+            pattern_cache=pattern_cache,
+        )
+    if name == "prob":
+        from prob_player import probabilityPlayer
+        return probabilityPlayer(
+            exact_prob=exact_prob, record_data=record_data,
+            width=width, height=height, bomb_count=bomb_count, headless=True, bitboard=bitboard,
+            pattern_cache=pattern_cache,
+        )
+    if name == "neural":
+        from neural_net_player import neuralNetPlayer
+        return neuralNetPlayer(
+            exact_prob=exact_prob, record_data=record_data,
+            width=width, height=height, bomb_count=bomb_count, headless=True, bitboard=bitboard,
+            pattern_cache=pattern_cache,
+        )
+    raise ValueError("Unknown player: {}".format(name))
+
+
+def init_worker(name, preset, exact_prob, record_data=True, bitboard=False, profile=False, pattern_cache=False):
+    global _player
+    _player = make_player(name, preset, exact_prob, record_data, bitboard, pattern_cache)
+    if profile:
+        Profiler().attach(_player)
+
+
+def run_game(task):
+    """
+    Play the game number `game` with its own seed on the worker player,
+    on the given serialized board if any
+    Returns (game, won, moves, guesses, serialized board if keep_board else None,
+    profiler record of the game if profiling else None)
+    """
+    seed, game, board, keep_board = task
+    _player.reset(seed=[seed, game])
+    random.seed(seed * 1000003 + game)
+    if board is not None:
+        _player.load_board(board)
+
+    # the players print every move, keep the workers quiet
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        moves, guesses = _player.play_game()
+    profile = _player.profiler.games.pop() if hasattr(_player, "profiler") else None
+    return game, _player.game_won, moves, guesses, _player.board_bytes() if keep_board else None, profile
+
+
+def simulate(name, preset, games, workers=1, seed=0, exact_prob=False, boards=None, keep_boards=False,
+             record_data=True, bitboard=False, profile=False, pattern_cache=False):
+    """
+    Play `games` games, or one game per serialized board when boards is given
+    Returns the statistics of the run as a dict, with the serialized boards
+    played in game order under "boards" when keep_boards is True
+    and the profiler records of the games under "profile" when profile is True
+    """
+    if boards is not None:
+        games = len(boards)
+    tasks = [
+        (seed, game, boards[game] if boards is not None else None, keep_boards)
+        for game in range(games)
+    ]
+    start = time.perf_counter()
+
+    if workers <= 1:
+        init_worker(name, preset, exact_prob, record_data, bitboard, profile, pattern_cache)
+        results = [run_game(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(
+            workers, initializer=init_worker, initargs=(name, preset, exact_prob, record_data, bitboard, profile, pattern_cache)
+        )
+        try:
+            results = list(pool.imap_unordered(run_game, tasks, chunksize=max(1, games // (workers * 8))))
+        finally:
+            # close and join rather than terminate, so the workers flush their buffered data
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda result: result[0])
+    won = sum(1 for result in results if result[1])
+    stats = {
+        "player": name,
+        "preset": preset,
+        "games": games,
+        "won": won,
+        "win_rate": won / games if games else 0.0,
+        "moves_per_game": sum(result[2] for result in results) / games if games else 0.0,
+        "guesses_per_game": sum(result[3] for result in results) / games if games else 0.0,
+        "games_per_second": games / elapsed if elapsed > 0 else 0.0,
+        "seconds": elapsed,
+    }
+    if keep_boards:
+        stats["boards"] = [result[4] for result in results]
+    if profile:
+        stats["profile"] = [result[5] for result in results]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many headless games of an AI player")
+    parser.add_argument("--player", choices=PLAYERS, default="logic")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="expert")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--exact-prob", action="store_true",
+        help="use the exact probability engine instead of the local heuristic (prob/neural)",
+    )
+    parser.add_argument("--boards", help="replay the boards of a file written with --save-boards")
+    parser.add_argument("--save-boards", help="save the boards played to this file")
+    parser.add_argument("--profile", help="write the timing of every phase to this JSON lines file")
+    parser.add_argument(
+        "--pattern-cache", action="store_true", help="strategy 2 from the cached 5x5 patterns (see pattern_cache.py)",
+    )
+    parser.add_argument("--bitboard", action="store_true", help="keep the board as bitsets too (see bitboard.py)")
+    parser.add_argument(
+        "--no-data", action="store_true", help="do not save the guesses as training data (prob/neural)",
+    )
+    args = parser.parse_args(argv)
+
+    boards = None
+    if args.boards:
+        boards = [encode_board(mines) for mines in load_boards(args.boards)]
+
+    stats = simulate(
+        args.player, args.preset, args.games, args.workers, args.seed, args.exact_prob,
+        boards=boards, keep_boards=args.save_boards is not None, record_data=not args.no_data,
+        bitboard=args.bitboard, profile=args.profile is not None, pattern_cache=args.pattern_cache,
+    )
+    if args.save_boards:
+        save_boards(args.save_boards, [decode_board(board)[0] for board in stats["boards"]])
+    if args.profile:
+        write_jsonl(args.profile, stats["profile"])
+
+    print("Player: {} on {} ({} games, seed {})".format(stats["player"], stats["preset"], stats["games"], args.seed))
+    print("Win rate: {:.4f} ({} won)".format(stats["win_rate"], stats["won"]))
+    print("Moves per game: {:.2f}".format(stats["moves_per_game"]))
+    print("Guesses per game: {:.2f}".format(stats["guesses_per_game"]))
+    print("Games per second: {:.2f}".format(stats["games_per_second"]))
+
+
+if __name__ == "__main__":
+    main()
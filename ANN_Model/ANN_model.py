@@ -1,44 +1,114 @@
 """
 Build the ANN model for the probability of a tile being a mine
+
+Training command, run from the ANN_Model folder:
+  python ANN_model.py [--data ../data/data_80_45.csv ../data/shards] [--epochs 100]
+
+The data is streamed in chunks, so it can grow past the memory
+
+It saves next to this file:
+  ann_model.h5  - the trained Keras model
+  scaler.npz    - the fitted feature scaler (see scaler.py)
+  ann_model.npz - the weights and scaler for the NumPy backend (see numpy_ann.py)
+
+Importing this module does not train anything, the players only read the saved files
 """
 
 # import the libraries
+import argparse
+import glob
+import os
+import sys
+
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 
-"""
-Part 1 - Data Preprocessing
-"""
-dir = '../data/'
-file_name = 'data_80_45.csv'
-datapath = dir + file_name
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from numpy_ann import export_numpy
+from scaler import save_scaler
 
-# import the dataset
-dataset = pd.read_csv(datapath)
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(MODEL_DIR, '..', 'data', 'data_80_45.csv')
+MODEL_PATH = os.path.join(MODEL_DIR, 'ann_model.h5')
+SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.npz')
+NUMPY_PATH = os.path.join(MODEL_DIR, 'ann_model.npz')
+SHARDS_DIR = os.path.join(MODEL_DIR, '..', 'data', 'shards')
+DATA_PREFIX = 'data_80_45'
 
-# !!! IMPORTANT: When the data gets too big, please cut off the data here
-# so that the game can load faster
-# We will keep the last 6250 rows of data here for this configuration (see the part 2 formula)
+CHUNK_ROWS = 100000 # rows read in memory at once
+SHUFFLE_ROWS = 100000 # size of the shuffle buffer of the training set
+TEST_SIZE = 0.2
 
-# last 6250 rows of data
-#dataset = dataset.iloc[-6250:, :]
-X = dataset.iloc[:, :-1].values
-y = dataset.iloc[:, -1].values
 
-# Encoding categorical data
-# Not needed for this dataset
+"""
+Part 1 - Data Preprocessing
 
-# Splitting the dataset into the Training set and Test set
-from sklearn.model_selection import train_test_split
-# 80% training set, 20% test set
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.2)
+The dataset is never loaded whole: it is read in chunks of chunk_rows rows,
+from the csv files (no header row) and from the .npy shards of the players (see AI_Player/data_sink.py),
+so the memory used stays the same whatever the number of collected guesses
+"""
+def data_files(datapaths, prefix=DATA_PREFIX):
+    # a directory stands for the shards of the given configuration it contains
+    files = []
+    for path in datapaths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '{}-*.npy'.format(prefix))))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_chunks(datapaths, chunk_rows=CHUNK_ROWS, prefix=DATA_PREFIX):
+    """
+    Yield the dataset as float arrays of at most chunk_rows rows, the label in the last column
+    """
+    for path in data_files(datapaths, prefix):
+        if path.endswith('.npy'):
+            data = np.load(path, mmap_mode='r')
+            for start in range(0, len(data), chunk_rows):
+                yield np.asarray(data[start:start + chunk_rows], dtype=float)
+        else:
+            for chunk in pd.read_csv(path, header=None, chunksize=chunk_rows):
+                yield chunk.values.astype(float)
+
+
+def test_mask(start, rows, test_size=TEST_SIZE):
+    """
+    Rows of the test set among the rows start..start+rows of the dataset
+    A row is picked by a hash of its position, so every pass over the data makes the same split
+    """
+    index = np.arange(start, start + rows, dtype=np.uint64)
+    hashed = (index * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    return hashed < np.uint64(test_size * 2 ** 32)
+
+
+def iter_split(datapaths, test=False, chunk_rows=CHUNK_ROWS, prefix=DATA_PREFIX):
+    """
+    Yield (X, y) chunks of the training set, or of the test set when test is True
+    """
+    start = 0
+    for chunk in iter_chunks(datapaths, chunk_rows, prefix):
+        mask = test_mask(start, len(chunk))
+        start += len(chunk)
+        if not test:
+            mask = ~mask
+        if mask.any():
+            yield chunk[mask, :-1], chunk[mask, -1]
+
+
+def fit_scaler(datapaths, chunk_rows=CHUNK_ROWS, prefix=DATA_PREFIX):
+    """
+    Fit the feature scaler on the training set one chunk at a time
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    sc = StandardScaler()
+    for X, _ in iter_split(datapaths, chunk_rows=chunk_rows, prefix=prefix):
+        sc.partial_fit(X)
+    if not hasattr(sc, 'mean_'):
+        raise ValueError('No training data in {}'.format(', '.join(datapaths)))
+    return sc
 
-# Feature Scaling
-from sklearn.preprocessing import StandardScaler
-sc = StandardScaler()
-X_train = sc.fit_transform(X_train) # fit the scaler to the training set, then transform the training set
-X_test = sc.transform(X_test) # transform the test set
 
 """
 Part 2 - Building the ANN
@@ -50,50 +120,104 @@ N(i) = number of neurons in the input layer
 N(o) = number of neurons in the output layer
 a = an arbitrary scaling factor usually between 2 and 10 (we use 2 here)
 """
+def build_model():
+    import tensorflow as tf
 
-# Initializing the ANN
-ann = tf.keras.models.Sequential()
-
-# Adding the input layer
-# units: number of nodes in the hidden layer
-ann.add(tf.keras.layers.Dense(units=12, activation='relu'))
+    # Initializing the ANN
+    ann = tf.keras.models.Sequential()
 
-# Adding the hidden layer
-ann.add(tf.keras.layers.Dense(units=12, activation='relu'))
+    # Adding the input layer
+    # units: number of nodes in the hidden layer
+    ann.add(tf.keras.layers.Dense(units=12, activation='relu'))
 
-# Adding the output layer
-# units: number of nodes in the output layer
-# activation: sigmoid function for binary output
-ann.add(tf.keras.layers.Dense(units=1, activation='sigmoid'))
+    # Adding the hidden layer
+    ann.add(tf.keras.layers.Dense(units=12, activation='relu'))
 
-"""
-Part 3 - Training the ANN
-"""
+    # Adding the output layer
+    # units: number of nodes in the output layer
+    # activation: sigmoid function for binary output
+    ann.add(tf.keras.layers.Dense(units=1, activation='sigmoid'))
 
-# Compiling the ANN
-# optimizer: adam is a stochastic gradient descent algorithm
-# loss: binary_crossentropy for binary output
-ann.compile(optimizer = 'adam', loss = 'binary_crossentropy', metrics = ['accuracy'])
+    # Compiling the ANN
+    # optimizer: adam is a stochastic gradient descent algorithm
+    # loss: binary_crossentropy for binary output
+    ann.compile(optimizer = 'adam', loss = 'binary_crossentropy', metrics = ['accuracy'])
+    return ann
 
-# Training the ANN on the Training set
-# batch_size: number of samples after which the weights are updated
-# epochs: number of iterations
-ann.fit(X_train, y_train, batch_size = 32, epochs = 100)
 
 """
-Part 4 - Making the predictions and evaluating the model
-"""
-
-# Predicting the Test set results
-y_pred = ann.predict(X_test)
-y_pred = (y_pred > 0.5) # convert the probability to binary output
-#print(np.concatenate((y_pred.reshape(len(y_pred),1), y_test.reshape(len(y_test),1)),1))
-
-# Making the Confusion Matrix
-from sklearn.metrics import confusion_matrix, accuracy_score
-cm = confusion_matrix(y_test, y_pred)
-print(cm)
-accuracy_score(y_test, y_pred)
+Part 3 - Training the ANN
 
-# Save the model
-tf.keras.models.save_model(ann, 'ann_model.h5')
+The training set is fed by a tf.data pipeline over the chunks,
+shuffled in a buffer of shuffle_rows rows rather than as a whole
+"""
+def training_dataset(datapaths, sc, batch_size=32, chunk_rows=CHUNK_ROWS, shuffle_rows=SHUFFLE_ROWS, prefix=DATA_PREFIX):
+    import tensorflow as tf
+
+    n_features = len(sc.mean_)
+
+    def scaled_chunks():
+        for X, y in iter_split(datapaths, chunk_rows=chunk_rows, prefix=prefix):
+            yield sc.transform(X).astype(np.float32), y.astype(np.float32)
+
+    dataset = tf.data.Dataset.from_generator(
+        scaled_chunks,
+        output_signature=(
+            tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    )
+    return dataset.unbatch().shuffle(shuffle_rows).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def train(datapaths=(DATA_PATH,), epochs=100, batch_size=32, chunk_rows=CHUNK_ROWS, prefix=DATA_PREFIX):
+    import tensorflow as tf
+    from sklearn.metrics import confusion_matrix
+
+    # Splitting the dataset into the Training set and Test set
+    # 80% training set, 20% test set, see test_mask
+    # Feature Scaling, fitted on the training set only
+    sc = fit_scaler(datapaths, chunk_rows, prefix)
+
+    ann = build_model()
+
+    # Training the ANN on the Training set
+    # batch_size: number of samples after which the weights are updated
+    # epochs: number of iterations, each one reads the data again
+    ann.fit(training_dataset(datapaths, sc, batch_size, chunk_rows, prefix=prefix), epochs = epochs)
+
+    """
+    Part 4 - Making the predictions and evaluating the model
+    """
+
+    # Predicting the Test set results chunk by chunk, and summing the Confusion Matrix
+    cm = np.zeros((2, 2), dtype=int)
+    for X_test, y_test in iter_split(datapaths, test=True, chunk_rows=chunk_rows, prefix=prefix):
+        y_pred = ann.predict(sc.transform(X_test), verbose=0)
+        y_pred = (y_pred > 0.5).ravel() # convert the probability to binary output
+        cm += confusion_matrix(y_test, y_pred, labels=[0, 1])
+    print(cm)
+    print(np.trace(cm) / cm.sum() if cm.sum() else 0.0)
+
+    # Save the model, with the scaler it was trained with
+    tf.keras.models.save_model(ann, MODEL_PATH)
+    save_scaler(sc, SCALER_PATH)
+
+    # Export the weights and the scaler for the NumPy inference backend
+    export_numpy(ann, sc, NUMPY_PATH)
+    return ann, sc
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the ANN on the collected guesses")
+    parser.add_argument(
+        "--data", nargs="+", default=[DATA_PATH] + ([SHARDS_DIR] if os.path.isdir(SHARDS_DIR) else []),
+        help="csv or .npy files, or directories of shards",
+    )
+    parser.add_argument("--prefix", default=DATA_PREFIX, help="configuration of the shards read from directories")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read in memory at once")
+    args = parser.parse_args()
+
+    train(args.data, args.epochs, args.batch_size, args.chunk_rows, args.prefix)
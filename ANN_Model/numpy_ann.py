@@ -0,0 +1,86 @@
+"""
+Pure NumPy inference of the trained ANN, without TensorFlow
+
+The weights of the Dense layers, their activations and the feature scaler
+parameters are exported to a small .npz archive by export_numpy,
+NumpyANN reads it back and evaluates the network with matrix products
+
+The training command (ANN_model.py) exports it, an existing model can be
+exported again from the ANN_Model folder with:
+  python numpy_ann.py
+"""
+
+import os
+
+import numpy as np
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "linear": lambda x: x,
+}
+
+
+def export_numpy(model, scaler, path):
+    """
+    Dump the Dense layers of a Keras model and the fitted scaler (mean_, scale_) to path
+    """
+    arrays = {}
+    activations = []
+    for i, layer in enumerate(model.layers):
+        weights, bias = layer.get_weights()
+        arrays["weights_{}".format(i)] = weights
+        arrays["bias_{}".format(i)] = bias
+        activations.append(layer.get_config()["activation"])
+    arrays["activations"] = np.array(activations)
+    arrays["scale_mean"] = scaler.mean_
+    arrays["scale_scale"] = scaler.scale_
+    np.savez(path, **arrays)
+
+
+class NumpyANN:
+    """
+    Same predict interface as the Keras model, on inputs already scaled with transform
+    """
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            activations = [str(name) for name in data["activations"]]
+            self.layers = [
+                (data["weights_{}".format(i)], data["bias_{}".format(i)], ACTIVATIONS[name])
+                for i, name in enumerate(activations)
+            ]
+            self.activations = activations
+            self.scale_mean = data["scale_mean"]
+            self.scale_scale = data["scale_scale"]
+
+    def transform(self, x):
+        """
+        Scale the features like the training set (StandardScaler.transform)
+        """
+        return (np.asarray(x, dtype=float) - self.scale_mean) / self.scale_scale
+
+    def predict(self, x, verbose=0):
+        """
+        Output of the network for every row of x, shape (rows, 1)
+        """
+        output = np.asarray(x, dtype=float)
+        for weights, bias, activation in self.layers:
+            output = activation(output @ weights + bias)
+        return output
+
+    def summary(self):
+        for (weights, _, _), name in zip(self.layers, self.activations):
+            print("Dense {} -> {} ({})".format(weights.shape[0], weights.shape[1], name))
+
+
+if __name__ == "__main__":
+    from tensorflow.keras.models import load_model
+    from scaler import load_scaler
+
+    model_dir = os.path.dirname(os.path.abspath(__file__))
+    export_numpy(
+        load_model(os.path.join(model_dir, 'ann_model.h5')),
+        load_scaler(os.path.join(model_dir, 'scaler.npz')),
+        os.path.join(model_dir, 'ann_model.npz'),
+    )
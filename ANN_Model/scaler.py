@@ -0,0 +1,36 @@
+"""
+Feature scaler saved next to the trained model
+
+Only the StandardScaler parameters are kept (mean_ and scale_),
+so the players can scale their features without sklearn nor retraining
+"""
+
+import numpy as np
+
+
+class FeatureScaler:
+    """
+    Standard scaling with fixed parameters, same transform as sklearn StandardScaler
+    """
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=float)
+        self.scale_ = np.asarray(scale, dtype=float)
+
+    def transform(self, x):
+        return (np.asarray(x, dtype=float) - self.mean_) / self.scale_
+
+
+def save_scaler(scaler, path):
+    """
+    Save the parameters of a fitted scaler (sklearn StandardScaler or FeatureScaler)
+    """
+    np.savez(path, mean=scaler.mean_, scale=scaler.scale_)
+
+
+def load_scaler(path):
+    """
+    Read a scaler saved by save_scaler
+    """
+    with np.load(path) as data:
+        return FeatureScaler(data["mean"], data["scale"])
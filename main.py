@@ -9,10 +9,6 @@ from AI_Player.logic_player import logicPlayer
 from AI_Player.prob_player import probabilityPlayer
 from AI_Player.neural_net_player import neuralNetPlayer
 
-from ANN_Model.ANN_model import sc
-
-from tensorflow.keras.models import load_model
-
 GAME_PLAYED = 0
 GAME_WON = 0
 WIN_RATE = [0]
@@ -24,18 +20,25 @@ if user_input == 'h':
     session.game_loop()
 elif user_input == 'a':
     more_input = input("Player with Logic(l), Probability(p) or with Neural Network(n)? (l/p/n): ")
+    # turbo: no 60 FPS cap, the window is only drawn every 100 moves
+    turbo = input("Turbo mode? (y/n): ") == 'y'
+    play_options = {'turbo': turbo, 'render_every': 100} if turbo else {}
+    # profile: timing of every phase, one JSON line per game (see AI_Player/profiler.py)
+    profile = input("Profile file (JSON lines, leave empty for none): ")
+    if profile:
+        play_options['profile'] = profile
     if more_input == 'l':
         player = logicPlayer()
-        player.play_simply()
+        player.play_simply(**play_options)
 
     elif more_input == 'p':
         player = probabilityPlayer()
-        player.play_simply()
+        player.play_simply(**play_options)
 
     elif more_input == 'n':
 
-        print("Before choosing to use Neural Network, please make sure there is data in {}". format('wherever you put the data'))
-        print("If there is no data, please run the probability player first to generate data")
+        print("Before choosing to use Neural Network, please make sure the model is trained: run `python ANN_model.py` from the ANN_Model folder")
+        print("It trains on the data of {}, if there is no data, please run the probability player first to generate data". format('data/'))
         
         player = neuralNetPlayer()
-        player.play_simply()
\ No newline at end of file
+        player.play_simply(**play_options)
\ No newline at end of file